@@ -1,17 +1,20 @@
+import time
+BOOT_STARTED = time.perf_counter()  # Used to report per-worker cold-start time
+
 from fastapi import FastAPI, Request, Response
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
 import sys
-from openai import OpenAI
 from contextlib import contextmanager
+from typing import Optional
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 import multiprocessing
+import threading
 
 
 def log_message(message: str, error: bool = False) -> None:
@@ -61,45 +64,198 @@ MAX_OVERFLOW = 2
 POOL_TIMEOUT = 30  # 30 seconds
 POOL_RECYCLE = 1800  # Recycle connections after 30 minutes
 
-log_message(f"Configuring DB pool with size {POOL_SIZE} and max overflow {MAX_OVERFLOW} based on {cpu_count} CPU cores")
-
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=POOL_SIZE,
-    max_overflow=MAX_OVERFLOW,
-    pool_timeout=POOL_TIMEOUT,
-    pool_recycle=POOL_RECYCLE,
-    pool_pre_ping=True,  # Enable connection health checks
-    connect_args={
-        "keepalives": 1,
-        "keepalives_idle": 30,
-        "keepalives_interval": 10,
-        "keepalives_count": 5,
-    }
-)
-SessionLocal = sessionmaker(bind=engine)
+# Optional read replica for read-only sessions (see read_db_context); without one they use the primary. A client that
+# just wrote reads from the primary for READ_YOUR_WRITES_SECONDS afterwards, so replication lag can't hide its write
+READ_REPLICA_DATABASE_URL = os.environ.get('READ_REPLICA_DATABASE_URL')
+READ_POOL_SIZE = int(os.environ.get('READ_POOL_SIZE', str(POOL_SIZE)))
+READ_MAX_OVERFLOW = int(os.environ.get('READ_MAX_OVERFLOW', str(MAX_OVERFLOW)))
+READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+PRIMARY_PIN_COOKIE = "read_primary"
+
+# Migrations normally run once, before the workers are forked (see docker-entrypoint.sh)
+RUN_MIGRATIONS = os.environ.get('RUN_MIGRATIONS', '1') == '1'
+
+# The engines (and their DBAPI import) are created on first use rather than at import time
+engine = None
+read_engine = None  # The replica's engine, if READ_REPLICA_DATABASE_URL is set
+_read_only_engines = {}  # Read-only views of engine and read_engine, which share their pools
+_engine_lock = threading.Lock()  # Threadpool threads can race to create the engine; each would get its own pool
+_read_engine_lock = threading.Lock()
+SessionLocal = sessionmaker()
 Base = declarative_base()
 
 
+def create_pooled_engine(url: str, pool_size: int, max_overflow: int):
+    from sqlalchemy import create_engine
+
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,  # Enable connection health checks
+        connect_args={
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5,
+        }
+    )
+
+
+def get_engine():
+    """Create the shared SQLAlchemy engine on first use and bind SessionLocal to it."""
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                log_message(f"Configuring DB pool with size {POOL_SIZE} and max overflow {MAX_OVERFLOW} based on {cpu_count} CPU cores")
+                new_engine = create_pooled_engine(DATABASE_URL, POOL_SIZE, MAX_OVERFLOW)
+                SessionLocal.configure(bind=new_engine)
+                engine = new_engine
+    return engine
+
+
+def get_read_engine(primary: bool = False):
+    """
+    Engine for read-only sessions: the replica's, or the primary's if primary is set or no replica is configured.
+    Its transactions are READ ONLY, so a write on a read path fails on the primary just like it would on the replica
+    """
+    global read_engine
+    base_engine = get_engine() if primary or not READ_REPLICA_DATABASE_URL else read_engine
+    if base_engine in _read_only_engines:
+        return _read_only_engines[base_engine]
+    with _read_engine_lock:
+        if READ_REPLICA_DATABASE_URL and not primary and read_engine is None:
+            log_message(f"Configuring read replica DB pool with size {READ_POOL_SIZE} and max overflow {READ_MAX_OVERFLOW}")
+            read_engine = create_pooled_engine(READ_REPLICA_DATABASE_URL, READ_POOL_SIZE, READ_MAX_OVERFLOW)
+        base_engine = get_engine() if primary or not READ_REPLICA_DATABASE_URL else read_engine
+        if base_engine not in _read_only_engines:
+            _read_only_engines[base_engine] = base_engine.execution_options(postgresql_readonly=True)
+        return _read_only_engines[base_engine]
+
+
 # Get database session
 @contextmanager
 def db_context():
     """Database session context manager for FastAPI dependency injection."""
+    # Imported here because backend.profiling depends on this module
+    from backend.profiling import profile_span
+
     log_message("Creating database session")
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        log_message("Closed database session")
+    with profile_span("db_context"):
+        get_engine()
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+            log_message("Closed database session")
+
+@contextmanager
+def read_db_context(request: Optional[Request] = None):
+    """
+    Read-only database session for GET routes, on the read replica if one is configured.
+    :param request: if specified and its client was pinned by pin_to_primary, the session reads from the primary
+    """
+    # Imported here because backend.profiling depends on this module
+    from backend.profiling import profile_span
+
+    primary = request is not None and PRIMARY_PIN_COOKIE in request.cookies
+    log_message(f"Creating read-only database session on the {'replica' if READ_REPLICA_DATABASE_URL and not primary else 'primary'}")
+    with profile_span("db_context"):
+        db = SessionLocal(bind=get_read_engine(primary=primary))
+        try:
+            yield db
+        finally:
+            db.close()
+            log_message("Closed read-only database session")
+
+
+def pin_to_primary(response: Response) -> None:
+    """
+    Have this client's reads use the primary for READ_YOUR_WRITES_SECONDS, so it sees the write it just made.
+    The pin is a short-lived cookie, so it holds whichever worker serves the next request
+    """
+    if not READ_REPLICA_DATABASE_URL:
+        return
+    secure = FRONTEND_URL.startswith("https://")
+    response.set_cookie(
+        PRIMARY_PIN_COOKIE, "1", max_age=READ_YOUR_WRITES_SECONDS, httponly=True,
+        secure=secure, samesite="none" if secure else "lax"  # The frontend is on another site in production
+    )
 
 # Configure OpenAI client
 OPEN_AI_ORG = os.environ.get("OPEN_AI_ORG")
 OPEN_AI_KEY = os.environ.get("OPEN_AI_KEY")
-open_ai_client = OpenAI(
-    organization=OPEN_AI_ORG,
-    api_key=OPEN_AI_KEY
-)
+OPEN_AI_BASE_URL = os.environ.get("OPEN_AI_BASE_URL")  # Only set to point at an OpenAI-compatible stand-in (e.g. benchmarks)
+open_ai_client = None
+_open_ai_client_lock = threading.Lock()
+
+
+def get_open_ai_client():
+    """Create the shared OpenAI client on first use; importing openai is a large part of worker boot time."""
+    global open_ai_client
+    if open_ai_client is None:
+        with _open_ai_client_lock:
+            if open_ai_client is None:
+                from openai import OpenAI
+
+                open_ai_client = OpenAI(
+                    organization=OPEN_AI_ORG,
+                    api_key=OPEN_AI_KEY,
+                    base_url=OPEN_AI_BASE_URL
+                )
+    return open_ai_client
+
+
+# Tiered extraction: try the fast model first and escalate to the strong one only when its output is rejected
+EXTRACTION_FAST_MODEL = os.environ.get("EXTRACTION_FAST_MODEL", "gpt-4o-mini")  # Empty string disables the fast tier
+EXTRACTION_STRONG_MODEL = os.environ.get("EXTRACTION_STRONG_MODEL", "gpt-4o")
+# Escalate if at least this fraction of fields came back N/A for a text at least this long
+EXTRACTION_ESCALATE_NA_FRACTION = float(os.environ.get("EXTRACTION_ESCALATE_NA_FRACTION", "0.8"))
+EXTRACTION_ESCALATE_MIN_CHARS = int(os.environ.get("EXTRACTION_ESCALATE_MIN_CHARS", "3000"))
+# "json" requests schema-constrained output keyed by short field ids; "lines" uses the older labeled line format
+EXTRACTION_FORMAT = os.environ.get("EXTRACTION_FORMAT", "json")
+
+# Relevance prefilter (see backend.relevance), off unless RELEVANCE_PREFILTER=1: fields whose description has a cosine
+# similarity below RELEVANCE_THRESHOLD to every chunk (of about RELEVANCE_CHUNK_CHARS) of a text are set to None
+# without asking the LLM. Tune the threshold with backend.benchmarks.relevance, which reports recall
+RELEVANCE_PREFILTER = os.environ.get("RELEVANCE_PREFILTER", "0") == "1"
+RELEVANCE_EMBEDDING_MODEL = os.environ.get("RELEVANCE_EMBEDDING_MODEL", "text-embedding-3-small")
+RELEVANCE_THRESHOLD = float(os.environ.get("RELEVANCE_THRESHOLD", "0.25"))
+RELEVANCE_CHUNK_CHARS = int(os.environ.get("RELEVANCE_CHUNK_CHARS", "800"))
+
+# OpenAI call resilience (see backend.llm_resilience): every extraction must finish within LLM_DEADLINE_SECONDS
+# (kept below gunicorn's 30 s worker timeout), a duplicate request is sent once a call is slower than this percentile
+# of its model's recent latencies ("0" disables hedging), and calls to a model whose circuit breaker is open go to
+# LLM_FALLBACK_MODEL if it is set, or fail immediately otherwise
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", "25"))
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_FALLBACK_MODEL = os.environ.get("LLM_FALLBACK_MODEL", "")
+
+# Near-duplicate submissions (Jaccard similarity of word shingles): flag at the first threshold, and reuse the earlier
+# extraction instead of calling the LLM at the second
+DUPLICATE_FLAG_THRESHOLD = float(os.environ.get("DUPLICATE_FLAG_THRESHOLD", "0.7"))
+DUPLICATE_REUSE_THRESHOLD = float(os.environ.get("DUPLICATE_REUSE_THRESHOLD", "0.9"))
+
+# Submissions with an Idempotency-Key header: completed results are replayed for this long, and a duplicate of an
+# in-flight submission waits up to IDEMPOTENCY_WAIT_SECONDS for it to finish
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "120"))
+
+# Users allowed to call admin endpoints (e.g. bulk import), as a comma-separated list of User ids
+ADMIN_USER_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+# Per-request sampling profiler (see backend.profiling), off unless PROFILING_ENABLED=1. When on, admins can profile a
+# request by sending "X-Profile: 1", and PROFILE_SAMPLE_RATE of all requests are profiled. The newest PROFILE_MAX_FILES
+# speedscope files are kept in PROFILE_DIR
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
 
 # Define allowed origins (currently only the frontend URL)
 allowed_origins = {
@@ -109,9 +265,10 @@ allowed_origins = {
 
 def create_app():
     """Factory function to create a new FastAPI application instance."""
-    # Initialize database tables
-    from backend.database import init_db
-    init_db()
+    # Initialize database tables, unless that already happened before the workers were forked
+    if RUN_MIGRATIONS:
+        from backend.database import init_db
+        init_db()
 
     app = FastAPI()
 
@@ -125,7 +282,7 @@ def create_app():
                 "Access-Control-Allow-Origin": request.headers.get("Origin", FRONTEND_URL),
                 "Access-Control-Allow-Credentials": "true",
                 "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With",
+                "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With, Idempotency-Key, X-Profile",
             }
         )
 
@@ -146,7 +303,7 @@ def create_app():
         headers = {
             "Access-Control-Allow-Origin": allowed_origin,
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With, Idempotency-Key, X-Profile",
             "Access-Control-Expose-Headers": "*",
         }
 
@@ -177,11 +334,27 @@ def create_app():
             )
             return error_response
 
+    # Added after the CORS middleware so that its time is part of the profile
+    if PROFILING_ENABLED:
+        from backend.profiling import add_profiling_middleware
+        add_profiling_middleware(app)
+
     # Import and include routers
     from backend.auth import router as auth_router
     from backend.experience import router as experience_router
+    from backend.search import router as search_router
+    from backend.fields import router as fields_router
+    from backend.export import router as export_router
+    from backend.bulk_import import router as bulk_import_router
+    from backend.profiling import router as profiling_router
 
     app.include_router(auth_router)
     app.include_router(experience_router)
+    app.include_router(search_router)
+    app.include_router(fields_router)
+    app.include_router(export_router)
+    app.include_router(bulk_import_router)
+    app.include_router(profiling_router)
 
+    log_message(f"App created in {(time.perf_counter() - BOOT_STARTED) * 1000:.0f} ms after import (migrations {'on' if RUN_MIGRATIONS else 'off'})")
     return app
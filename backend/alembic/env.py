@@ -19,6 +19,7 @@ sys.path.append(str(project_root))
 # Import your models and config
 from backend import Base, DATABASE_URL
 from backend.models import *  # This ensures all models are loaded
+from backend.fields import FIELD_INDEX_PREFIX
 
 # Alembic Config object
 config = context.config
@@ -35,6 +36,28 @@ config.set_main_option('sqlalchemy.url', DATABASE_URL)
 
 target_metadata = Base.metadata
 
+# The pre-JSONB field value table and the embedding column that references it, kept until a later revision drops them
+# (see the 4e8a1f6c2b90 migration)
+RETAINED_OBJECTS = {
+    ("table", "parse_field_value_eav"),
+    ("column", "parsed_field_value_id"),
+    ("foreign_key_constraint", "embedding_parsed_field_value_id_fkey"),
+}
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Leave tables that are really views (created by their own migrations), the per-field indexes (one per
+    ParseField, see backend.fields.create_field_indexes) and RETAINED_OBJECTS out of autogenerate
+    """
+    if type_ == "index" and reflected and name.startswith(FIELD_INDEX_PREFIX):
+        return False
+    if reflected and (type_, name) in RETAINED_OBJECTS:
+        return False
+    return not (type_ == "table" and object.info.get("is_view", False))
+
+# Arbitrary key for the Postgres advisory lock that keeps concurrent processes (e.g. several workers) from migrating at once
+MIGRATION_LOCK_KEY = 724510931
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
@@ -43,7 +66,8 @@ def run_migrations_offline():
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
-        compare_type=True  # Detect column type changes
+        compare_type=True,  # Detect column type changes
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -62,9 +86,13 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             compare_type=True,  # Detect column type changes
-            compare_server_default=True  # Detect default value changes
+            compare_server_default=True,  # Detect default value changes
+            include_object=include_object
         )
 
+        # Held until the connection closes; whoever waits gets the lock once the database is already at head
+        connection.execute(f'SELECT pg_advisory_lock({MIGRATION_LOCK_KEY});')
+
         # Ensure pgvector extension exists before running migrations
         connection.execute('CREATE EXTENSION IF NOT EXISTS vector;')
         
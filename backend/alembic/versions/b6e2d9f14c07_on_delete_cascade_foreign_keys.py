@@ -0,0 +1,40 @@
+"""ON DELETE CASCADE foreign keys
+
+Revision ID: b6e2d9f14c07
+Revises: 71d0c4e5f8a2
+Create Date: 2026-10-20 09:31:55.102764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d9f14c07'
+down_revision: Union[str, None] = '71d0c4e5f8a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referred table); constraint names are the Postgres defaults the tables were created with
+CASCADING_FOREIGN_KEYS = [
+    ('parsed_response', 'user_id', 'user'),
+    ('parse_field_value', 'parse_field_id', 'parse_field'),
+    ('parse_field_value', 'parsed_response_id', 'parsed_response'),
+    ('embedding', 'parsed_response_id', 'parsed_response'),
+    ('embedding', 'parsed_field_value_id', 'parse_field_value'),
+]
+
+
+def upgrade() -> None:
+    for table, column, referred_table in CASCADING_FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred_table, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    for table, column, referred_table in CASCADING_FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred_table, [column], ['id'])
@@ -0,0 +1,41 @@
+"""Add a browse index per field
+
+Revision ID: c5d8a2f7e613
+Revises: 4e8a1f6c2b90
+Create Date: 2026-10-21 14:38:09.276514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8a2f7e613'
+down_revision: Union[str, None] = '4e8a1f6c2b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Replaces ix_parse_field_value_field_response for existing fields: /api/field/values reads a page of one field
+# in id order straight from it. Fields added later are indexed by python -m backend.fields --create-indexes.
+# Built concurrently (outside the migration's transaction) so writes to parsed_response go on meanwhile
+CREATE_BROWSE_INDEX = """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_parsed_response_field_{field_id}_browse ON parsed_response (id)
+    WHERE (field_values ->> '{field_id}') IS NOT NULL
+"""
+
+
+def field_ids() -> list[int]:
+    return [row[0] for row in op.get_bind().exec_driver_sql("SELECT id FROM parse_field ORDER BY id")]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for field_id in field_ids():
+            op.execute(CREATE_BROWSE_INDEX.format(field_id=field_id))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for field_id in field_ids():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_parsed_response_field_{field_id}_browse")
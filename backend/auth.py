@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, Response, HTTPException, BackgroundTasks
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta, timezone
 import json
@@ -6,6 +6,7 @@ import uuid
 import os
 from jose.exceptions import JWTError
 from oauthlib.oauth2 import WebApplicationClient
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from jose import jwt
 from dotenv import load_dotenv
@@ -14,9 +15,9 @@ import requests
 from backend import (
     log_message, JWT_SECRET_KEY, JWT_ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS,
-    db_context
+    ADMIN_USER_IDS, db_context, read_db_context, pin_to_primary
 )
-from backend.models import User
+from backend.models import User, ParsedResponse
 
 router = APIRouter()
 
@@ -80,6 +81,14 @@ async def get_current_user(
     return user
 
 
+async def get_admin_user(request: Request, db: Session) -> User:
+    """Get current user from JWT token, requiring them to be listed in ADMIN_USER_IDS"""
+    user = await get_current_user(request=request, db=db, optional=False)
+    if user.id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
 def create_tokens(user_id: int) -> Dict[str, str]:
     """Create access and refresh tokens"""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -120,7 +129,7 @@ async def api_linkedin_login():
     return {"auth_url": auth_url}
 
 @router.post("/api/auth/linkedin/callback")
-async def api_linkedin_callback(request: Request):
+async def api_linkedin_callback(request: Request, response: Response):
     """Handle LinkedIn OAuth callback"""
     with db_context() as db:
         # Get request data
@@ -228,6 +237,7 @@ async def api_linkedin_callback(request: Request):
         
         # Create JWT tokens
         tokens = create_tokens(user.id)
+        pin_to_primary(response)  # The frontend calls /api/me next, and the user may be new
         
         return {
             "access_token": tokens["access_token"],
@@ -253,7 +263,7 @@ async def api_refresh(
 async def api_get_me(
         request: Request,
 ):
-    with db_context() as db:
+    with read_db_context(request) as db:
         log_message("api_get_me called")
         current_user = await get_current_user(request=request, db=db, optional=True)
         log_message(f"get_current_user returned: {current_user}")
@@ -322,16 +332,55 @@ def extract_linkedin_email(user_info: Dict[str, Any]) -> Optional[str]:
     
     return None
 
+# Accounts with more experiences than this are deleted in batches by a background task
+ACCOUNT_DELETE_BACKGROUND_THRESHOLD = 200
+ACCOUNT_DELETE_BATCH_SIZE = 200
+
+
+def delete_account(user_id: int, batch_size: int = ACCOUNT_DELETE_BATCH_SIZE) -> None:
+    """Delete a user's experiences in batches (one short transaction each), then the user"""
+    from backend.experience import delete_parsed_responses  # Imported here because backend.experience depends on this module
+
+    with db_context() as db:
+        try:
+            while True:
+                response_ids = [response_id for (response_id,) in db.query(ParsedResponse.id)
+                                .filter(ParsedResponse.user_id == user_id).order_by(ParsedResponse.id).limit(batch_size)]
+                if not response_ids:
+                    break
+                delete_parsed_responses(db, response_ids)
+                db.commit()
+            db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+            db.commit()
+            log_message(f"Deleted account {user_id}")
+        except Exception as e:
+            db.rollback()
+            log_message(f"Failed to delete account {user_id}: {str(e)}", error=True)
+            raise
+
 @router.post('/api/delete-account')
 async def api_delete_account(
         request: Request,
+        background_tasks: BackgroundTasks,
 ):
     with db_context() as db:
         current_user = await get_current_user(request=request, db=db, optional=False)
         log_message(f"api_delete_account called with current_user: {current_user}")
+        user_id = current_user.id
+
+        experience_count = db.query(func.count(ParsedResponse.id)).filter(ParsedResponse.user_id == user_id).scalar()
+        if experience_count > ACCOUNT_DELETE_BACKGROUND_THRESHOLD:
+            background_tasks.add_task(delete_account, user_id)
+            return {
+                "message": "Account deletion scheduled"
+            }
+
+        from backend.experience import delete_parsed_responses  # Imported here because backend.experience depends on this module
 
         try:
-            db.delete(current_user)
+            response_ids = [response_id for (response_id,) in db.query(ParsedResponse.id).filter(ParsedResponse.user_id == user_id)]
+            delete_parsed_responses(db, response_ids)
+            db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
             db.commit()
         except Exception as e:
             db.rollback()
@@ -0,0 +1,58 @@
+"""Measure per-worker cold-start time: importing backend and building the app in a fresh interpreter.
+
+Each run is a separate process, like a newly forked (non-preloaded) gunicorn worker. Reports create_app()
+time with and without in-worker migrations, plus the deferred cost of first DB and OpenAI client use.
+Requires the backend's usual environment (e.g. backend/.env). Run from the repository root:
+    python -m backend.benchmarks.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from backend.benchmarks.run import percentile
+
+WORKER_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import backend
+imported = time.perf_counter()
+backend.create_app()
+created = time.perf_counter()
+with backend.get_engine().connect():
+    pass
+connected = time.perf_counter()
+backend.get_open_ai_client()
+clients = time.perf_counter()
+print("COLD_START " + json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - started) * 1000,
+    "first_db_connection_ms": (connected - created) * 1000,
+    "openai_client_ms": (clients - connected) * 1000,
+}))
+"""
+
+
+def measure(runs: int, run_migrations: bool) -> dict:
+    env = dict(os.environ, RUN_MIGRATIONS="1" if run_migrations else "0")
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", WORKER_SCRIPT], env=env, capture_output=True, text=True, check=True).stdout
+        line = next(line for line in output.splitlines() if line.startswith("COLD_START "))
+        samples.append(json.loads(line.removeprefix("COLD_START ")))
+    return {
+        key: {"p50": percentile([s[key] for s in samples], 0.5), "max": round(max(s[key] for s in samples), 3)}
+        for key in samples[0]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure worker cold-start time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per configuration")
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "migrations_in_worker": measure(args.runs, run_migrations=True),
+        "migrations_skipped": measure(args.runs, run_migrations=False),
+    }, indent=2))
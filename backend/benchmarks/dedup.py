@@ -0,0 +1,136 @@
+"""Near-duplicate lookup cost as the corpus grows.
+
+Grows a synthetic corpus (owned by one benchmark user) through --sizes, signing every experience, and at
+each size times signature computation and find_near_duplicate() for lightly edited copies of stored texts
+and for unrelated texts. It then checks that lookups stay within one user: a second user submitting a stored
+text verbatim must not match the first user's copy, and must match their own once it is stored. Exits with
+status 1 if that check fails. Requires the backend's usual environment; point DATABASE_URL at a disposable
+database. Run from the repository root:
+    python -m backend.benchmarks.dedup --sizes 1000,10000,100000 --output dedup.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from backend.benchmarks.run import BenchData, percentile
+from backend.benchmarks.search import synthetic_document
+
+
+def edit_lightly(rng: random.Random, text: str, fraction: float = 0.05) -> str:
+    words = text.split()
+    for _ in range(max(1, int(len(words) * fraction))):
+        words[rng.randrange(len(words))] = rng.choice(["tweaked", "changed", "edited", "revised"])
+    return " ".join(words)
+
+
+def grow_corpus(user_id: int, count: int, rng: random.Random, stored_texts: list[str], chunk_size: int = 2000) -> None:
+    from backend import db_context
+    from backend.dedup import minhash, shingles, save_signature
+    from backend.models import ParsedResponse
+
+    while count > 0:
+        chunk = min(chunk_size, count)
+        with db_context() as db:
+            responses = [
+                ParsedResponse(user_id=user_id, name="Dedup benchmark", raw_text=synthetic_document(rng, rng.randint(80, 600)), anonymize=False)
+                for _ in range(chunk)
+            ]
+            db.bulk_save_objects(responses, return_defaults=True)
+            for response in responses:
+                save_signature(db, response.id, minhash(shingles(response.raw_text)))
+            db.commit()
+        stored_texts.extend(response.raw_text for response in responses)
+        count -= chunk
+
+
+def time_lookups(user_id: int, texts: list[str]) -> dict:
+    from backend import db_context
+    from backend.dedup import minhash, shingles, find_near_duplicate
+
+    signature_ms, lookup_ms, matches = [], [], 0
+    with db_context() as db:
+        for text in texts:
+            start = time.perf_counter()
+            signature = minhash(shingles(text))
+            signed = time.perf_counter()
+            match = find_near_duplicate(db, text, signature, user_id)
+            signature_ms.append((signed - start) * 1000)
+            lookup_ms.append((time.perf_counter() - signed) * 1000)
+            matches += match is not None
+    return {
+        "lookups": len(texts),
+        "matches": matches,
+        "signature_ms": {"p50": percentile(signature_ms, 0.5), "p95": percentile(signature_ms, 0.95)},
+        "lookup_ms": {"p50": percentile(lookup_ms, 0.5), "p95": percentile(lookup_ms, 0.95)},
+    }
+
+
+def check_cross_user(data: BenchData, user_id: int, text: str) -> dict:
+    """Submit text, already stored for user_id, as another user: only that user's own copy may be found"""
+    from backend import db_context
+    from backend.dedup import minhash, shingles, find_near_duplicate, save_signature
+    from backend.models import ParsedResponse
+
+    signature = minhash(shingles(text))
+    with db_context() as db:
+        other_user_id, _ = data.create_user(db)
+        db.commit()
+        owner_match = find_near_duplicate(db, text, signature, user_id)
+        other_match = find_near_duplicate(db, text, signature, other_user_id)
+
+        response = ParsedResponse(user_id=other_user_id, name="Dedup benchmark", raw_text=text, anonymize=False)
+        db.add(response)
+        db.flush()
+        save_signature(db, response.id, signature)
+        db.commit()
+        own_match = find_near_duplicate(db, text, signature, other_user_id)
+    return {
+        "checks": {
+            "owner_finds_stored_copy": owner_match is not None,
+            "other_user_does_not_find_it": other_match is None,
+            "other_user_finds_own_copy": own_match is not None and own_match.parsed_response_id == response.id,
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate lookups")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated corpus sizes")
+    parser.add_argument("--lookups", type=int, default=50, help="Lookups of each kind per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-data", action="store_true")
+    parser.add_argument("--output", default="dedup_benchmark.json")
+    args = parser.parse_args()
+
+    from backend import db_context
+
+    rng = random.Random(args.seed)
+    data = BenchData(run_id=f"dedup-{int(time.time())}")
+    with db_context() as db:
+        user_id, _ = data.create_user(db)
+        db.commit()
+
+    results = {}
+    stored_texts = []
+    try:
+        for size in sorted(int(size) for size in args.sizes.split(",")):
+            grow_corpus(user_id, size - len(stored_texts), rng, stored_texts)
+            results[str(size)] = {
+                "near_duplicates": time_lookups(user_id, [edit_lightly(rng, rng.choice(stored_texts)) for _ in range(args.lookups)]),
+                "unrelated": time_lookups(user_id, [synthetic_document(rng, rng.randint(80, 600)) for _ in range(args.lookups)]),
+            }
+            print(json.dumps({size: results[str(size)]}, indent=2))
+        results["cross_user"] = check_cross_user(data, user_id, rng.choice(stored_texts))
+        print(json.dumps({"cross_user": results["cross_user"]}, indent=2))
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    finally:
+        if not args.keep_data:
+            data.cleanup()
+
+    failed = [check for check, passed in results["cross_user"]["checks"].items() if not passed]
+    if failed:
+        print(f"FAILED: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
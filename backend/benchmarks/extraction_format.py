@@ -0,0 +1,112 @@
+"""Compare the "lines" and "json" extraction formats on the same texts.
+
+Reports prompt/completion tokens, latency, attempts and failures per extraction for each format, plus the
+relative reduction of the json format. Texts come from a JSONL file (one {"experience": ...} per line) or
+the most recent stored experiences. Run from the repository root, e.g.:
+    python -m backend.benchmarks.extraction_format --input sample.jsonl --output formats.json
+    python -m backend.benchmarks.extraction_format --fake --sample 20
+"""
+import argparse
+import json
+import random
+import time
+
+from backend.benchmarks.fake_openai import FakeOpenAIServer, add_config_arguments, config_from_args
+from backend.benchmarks.run import percentile, synthetic_text, use_openai_base_url
+
+FORMATS = ("lines", "json")
+
+
+def load_texts(input_path: str, sample: int, fake: bool, seed: int) -> list[str]:
+    if input_path is not None:
+        with open(input_path) as f:
+            return [json.loads(line)["experience"] for line in f if line.strip()][:sample]
+    if fake:
+        rng = random.Random(seed)
+        return [synthetic_text(rng) for _ in range(sample)]
+
+    from backend import db_context
+    from backend.models import ParsedResponse
+
+    with db_context() as db:
+        rows = db.query(ParsedResponse.raw_text).order_by(ParsedResponse.created_at.desc()).limit(sample).all()
+    return [row.raw_text for row in rows]
+
+
+def measure(texts: list[str], extraction_format: str) -> dict:
+    from backend.utils import extract_fields
+
+    extractions = []
+    for text in texts:
+        call_log = []
+        start = time.perf_counter()
+        try:
+            extract_fields(text, call_log=call_log, extraction_format=extraction_format)
+            succeeded = True
+        except Exception:
+            succeeded = False
+        extractions.append({
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "attempts": len(call_log),
+            "prompt_tokens": sum(call.get("prompt_tokens") or 0 for call in call_log),
+            "completion_tokens": sum(call.get("completion_tokens") or 0 for call in call_log),
+            "first_attempt_valid": bool(call_log) and call_log[0]["valid"] is True,
+            "succeeded": succeeded,
+        })
+
+    def mean(key):
+        return round(sum(e[key] for e in extractions) / len(extractions), 2) if extractions else None
+
+    latencies = [e["latency_ms"] for e in extractions]
+    return {
+        "extractions": len(extractions),
+        "failures": sum(1 for e in extractions if not e["succeeded"]),
+        "first_attempt_valid_rate": round(sum(1 for e in extractions if e["first_attempt_valid"]) / len(extractions), 3) if extractions else None,
+        "mean_attempts": mean("attempts"),
+        "mean_prompt_tokens": mean("prompt_tokens"),
+        "mean_completion_tokens": mean("completion_tokens"),
+        "latency_ms": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare extraction output formats")
+    parser.add_argument("--input", default=None, help="JSONL file of {\"experience\": ...} records")
+    parser.add_argument("--sample", type=int, default=20, help="Number of texts to extract")
+    parser.add_argument("--fake", action="store_true", help="Use a local fake OpenAI server and synthetic texts")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    fake_server = None
+    if args.fake:
+        fake_server = FakeOpenAIServer(config_from_args(args)).start()
+        use_openai_base_url(fake_server.base_url)
+    try:
+        texts = load_texts(args.input, args.sample, args.fake, args.seed)
+        results = {extraction_format: measure(texts, extraction_format) for extraction_format in FORMATS}
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+
+    def reduction(key, nested=None):
+        old, new = results["lines"][key], results["json"][key]
+        if nested is not None:
+            old, new = old[nested], new[nested]
+        return round((old - new) / old * 100, 1) if old else None
+
+    results["json_reduction_pct"] = {
+        "completion_tokens": reduction("mean_completion_tokens"),
+        "prompt_tokens": reduction("mean_prompt_tokens"),
+        "latency_p50": reduction("latency_ms", "p50"),
+        "latency_p95": reduction("latency_ms", "p95"),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Local stand-in for the OpenAI API, used by the benchmark suite.
+
+Serves just enough of the chat completions API for extract_fields (line format and json_schema structured
+output) and of the embeddings API for the relevance prefilter, with configurable latency, output and error
+injection. Run standalone (from the repository root) with:
+    python -m backend.benchmarks.fake_openai --port 8001 --latency-ms 800
+and point the backend at it with OPEN_AI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+FIELDS_PATH = Path(__file__).parent.parent / "fields_for_extraction.txt"
+EMBEDDING_DIMENSIONS = 256
+
+
+def load_fields() -> list[str]:
+    """Read fields_for_extraction.txt without importing the backend package (which requires its env vars)."""
+    return [line.strip() for line in FIELDS_PATH.read_text().splitlines() if line.strip() != ""]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for usage accounting."""
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAIConfig:
+    def __init__(
+            self,
+            latency_ms: float = 500,
+            jitter_ms: float = 100,
+            na_fraction: float = 0.5,
+            invalid_rate: float = 0.0,
+            error_rate: float = 0.0,
+            tail_rate: float = 0.0,
+            tail_latency_ms: float = 0.0,
+            seed: Optional[int] = None
+    ):
+        """
+        :param latency_ms: mean response latency
+        :param jitter_ms: maximum random deviation from latency_ms (uniform)
+        :param na_fraction: fraction of fields answered with "N/A"
+        :param invalid_rate: fraction of completions that break the expected line format (forces a retry)
+        :param error_rate: fraction of requests answered with HTTP 500
+        :param tail_rate: fraction of requests that take tail_latency_ms instead (a slow tail, for hedging)
+        :param tail_latency_ms: latency of the slow tail
+        :param seed: random seed, for reproducible runs
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.na_fraction = na_fraction
+        self.invalid_rate = invalid_rate
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency_ms = tail_latency_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self) -> float:
+        with self.lock:
+            return self.random.random()
+
+    def sleep(self) -> None:
+        with self.lock:
+            if self.random.random() < self.tail_rate:
+                latency_ms = self.tail_latency_ms
+            else:
+                latency_ms = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, latency_ms) / 1000)
+
+
+def make_extraction_content(fields: list[str], config: FakeOpenAIConfig) -> str:
+    """Build a completion in the line format expected by extract_fields."""
+    lines = []
+    for field in fields:
+        if config.draw() < config.na_fraction:
+            lines.append(f"{field}: N/A")
+        else:
+            lines.append(f"{field}: Synthetic summary for {field.split(' (')[0].lower()}.")
+    if config.draw() < config.invalid_rate:
+        lines[0] = "Sure! Here are the extracted fields:"
+    return "\n".join(lines)
+
+
+def make_structured_content(field_ids: list[str], config: FakeOpenAIConfig) -> str:
+    """Build a completion for a json_schema response_format, keyed by the schema's field ids."""
+    values = {}
+    for field_id in field_ids:
+        values[field_id] = None if config.draw() < config.na_fraction else f"Synthetic summary for field {field_id}."
+    content = json.dumps(values)
+    if config.draw() < config.invalid_rate:
+        content = content[:len(content) // 2]
+    return content
+
+
+def chat_completion(body: dict, config: FakeOpenAIConfig, fields: list[str]) -> dict:
+    prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = make_structured_content(list(response_format["json_schema"]["schema"]["properties"]), config)
+    else:
+        # The prompt may ask for a subset of the fields (e.g. after the relevance prefilter)
+        content = make_extraction_content([field for field in fields if field in prompt] or fields, config)
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-fake-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def embedding_vector(text: str) -> list[float]:
+    """Hashed bag of words, so that texts sharing words get similar embeddings"""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in re.findall(r"[a-z]+", text.lower()):
+        vector[zlib.crc32(word.encode()) % EMBEDDING_DIMENSIONS] += 1.0
+    return vector
+
+
+def embeddings(body: dict, config: FakeOpenAIConfig, fields: list[str]) -> dict:
+    inputs = body.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    prompt_tokens = sum(estimate_tokens(text) for text in inputs)
+    return {
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": embedding_vector(text)} for i, text in enumerate(inputs)],
+        "model": body.get("model", "fake"),
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+# Maps request path to a handler taking (request body, config, fields) and returning a JSON-serializable response
+ROUTES = {
+    "/v1/chat/completions": chat_completion,
+    "/v1/embeddings": embeddings,
+}
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server that can be started and stopped from within another process (e.g. the benchmark runner)."""
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeOpenAIConfig()
+        self.fields = load_fields()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                route = ROUTES.get(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.config.sleep()
+                if route is None:
+                    self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                elif server.config.draw() < server.config.error_rate:
+                    self.send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                else:
+                    self.send_json(200, route(body, server.config, server.fields))
+
+            def send_json(self, status: int, payload: dict):
+                encoded = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output clean
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=500, help="Mean fake OpenAI latency")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Uniform jitter around --latency-ms")
+    parser.add_argument("--na-fraction", type=float, default=0.5, help="Fraction of fields answered with N/A")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="Fraction of malformed completions")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of requests taking --tail-latency-ms")
+    parser.add_argument("--tail-latency-ms", type=float, default=0.0, help="Latency of the slow tail")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOpenAIConfig:
+    return FakeOpenAIConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        na_fraction=args.na_fraction,
+        invalid_rate=args.invalid_rate,
+        error_rate=args.error_rate,
+        tail_rate=args.tail_rate,
+        tail_latency_ms=args.tail_latency_ms,
+        seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    fake_server = FakeOpenAIServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Fake OpenAI server listening on {fake_server.base_url}")
+    fake_server.httpd.serve_forever()
@@ -0,0 +1,231 @@
+"""Compare the two layouts for extracted field values: one parse_field_value row per (response, field) (the old
+EAV table) and one JSONB object per response keyed by ParseField id (ParsedResponse.field_values).
+
+Builds both layouts in scratch tables (bench_eav_*, bench_jsonb_*) with the indexes each layout had in the app,
+fills them with the same synthetic values, and reports row counts, table/index sizes, write latency (single
+responses and batches) and read latency (one response's values, a page of responses, a per-field browse page,
+and a per-field full-text search). The scratch tables are dropped afterwards. Requires the backend's usual environment; point DATABASE_URL
+at a disposable database. Run from the repository root:
+    python -m backend.benchmarks.field_storage --responses 100000 --output field_storage.json
+"""
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy import text
+
+from backend.benchmarks.run import percentile
+
+WORDS = "we tried pricing hiring retail churn launch funding shipping the our after before customers margin runway".split()
+
+CREATE_TABLES = [
+    """CREATE TABLE bench_eav_response (id serial PRIMARY KEY)""",
+    """CREATE TABLE bench_eav_value (
+        id serial PRIMARY KEY,
+        parse_field_id integer NOT NULL,
+        parsed_response_id integer NOT NULL REFERENCES bench_eav_response (id) ON DELETE CASCADE,
+        value varchar(5000),
+        search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(value, ''))) STORED,
+        CONSTRAINT uq_bench_eav_value_response_field UNIQUE (parsed_response_id, parse_field_id)
+    )""",
+    """CREATE INDEX ix_bench_eav_value_search_vector ON bench_eav_value USING gin (search_vector)""",
+    """CREATE INDEX ix_bench_eav_value_field_response ON bench_eav_value (parse_field_id, parsed_response_id)
+        WHERE value IS NOT NULL""",
+    # search_vector stands in for ParsedResponse.search_vector, which also covers every field value
+    """CREATE TABLE bench_jsonb_response (
+        id serial PRIMARY KEY,
+        field_values jsonb,
+        search_vector tsvector GENERATED ALWAYS AS (jsonb_to_tsvector('english', coalesce(field_values, '{}'), '["string"]')) STORED
+    )""",
+    """CREATE INDEX ix_bench_jsonb_response_search_vector ON bench_jsonb_response USING gin (search_vector)""",
+]
+# One per field, as backend.fields.create_field_indexes makes them
+CREATE_FIELD_INDEXES = {
+    "jsonb": [
+        """CREATE INDEX ix_bench_jsonb_response_field_{field_id}_browse ON bench_jsonb_response (id)
+            WHERE (field_values ->> '{field_id}') IS NOT NULL""",
+    ],
+}
+DROP_TABLES = "DROP TABLE IF EXISTS bench_eav_value, bench_eav_response, bench_jsonb_response"
+
+READ_QUERIES = {
+    "eav": {
+        "one_response": "SELECT parse_field_id, value FROM bench_eav_value WHERE parsed_response_id = :id",
+        "page_of_responses": """
+            SELECT parsed_response_id, parse_field_id, value FROM bench_eav_value
+            WHERE parsed_response_id IN (SELECT id FROM bench_eav_response WHERE id <= :id ORDER BY id DESC LIMIT 20)
+        """,
+        "field_browse": """
+            SELECT parsed_response_id, value FROM bench_eav_value
+            WHERE parse_field_id = :field_id AND value IS NOT NULL AND parsed_response_id <= :id
+            ORDER BY parsed_response_id DESC LIMIT 20
+        """,
+        "field_search": """
+            SELECT parsed_response_id, ts_rank_cd(search_vector, websearch_to_tsquery('english', :q)) AS rank
+            FROM bench_eav_value
+            WHERE parse_field_id = :field_id AND search_vector @@ websearch_to_tsquery('english', :q)
+            ORDER BY rank DESC, parsed_response_id DESC LIMIT 20
+        """,
+    },
+    "jsonb": {
+        "one_response": "SELECT field_values FROM bench_jsonb_response WHERE id = :id",
+        "page_of_responses": "SELECT id, field_values FROM bench_jsonb_response WHERE id <= :id ORDER BY id DESC LIMIT 20",
+        # The key is inlined, as in the app, so the planner can match the field's partial index
+        "field_browse": """
+            SELECT id, field_values ->> '{field_id}' FROM bench_jsonb_response
+            WHERE (field_values ->> '{field_id}') IS NOT NULL AND id <= :id
+            ORDER BY id DESC LIMIT 20
+        """,
+        "field_search": """
+            SELECT id, ts_rank_cd(to_tsvector('english', coalesce(field_values ->> '{field_id}', '')), websearch_to_tsquery('english', :q)) AS rank
+            FROM bench_jsonb_response
+            WHERE search_vector @@ websearch_to_tsquery('english', :q)
+              AND to_tsvector('english', coalesce(field_values ->> '{field_id}', '')) @@ websearch_to_tsquery('english', :q)
+            ORDER BY rank DESC, id DESC LIMIT 20
+        """,
+    },
+}
+
+
+def synthetic_values(rng: random.Random, fields: int, null_rate: float) -> dict[int, str]:
+    """Field id -> value (None for a field that was extracted but not found)"""
+    return {
+        field_id: None if rng.random() < null_rate else " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+        for field_id in range(1, fields + 1)
+    }
+
+
+def write_eav(db, batch: list[dict]) -> None:
+    ids = [row[0] for row in db.execute(text(
+        "INSERT INTO bench_eav_response (id) SELECT nextval(pg_get_serial_sequence('bench_eav_response', 'id')) "
+        "FROM generate_series(1, :count) RETURNING id"
+    ), {"count": len(batch)})]
+    db.execute(text(
+        "INSERT INTO bench_eav_value (parse_field_id, parsed_response_id, value) VALUES (:field_id, :response_id, :value)"
+    ), [
+        {"field_id": field_id, "response_id": response_id, "value": value}
+        for response_id, values in zip(ids, batch)
+        for field_id, value in values.items()
+    ])
+
+
+def write_jsonb(db, batch: list[dict]) -> None:
+    db.execute(text("INSERT INTO bench_jsonb_response (field_values) VALUES (CAST(:field_values AS jsonb))"), [
+        {"field_values": json.dumps({str(field_id): value for field_id, value in values.items()})}
+        for values in batch
+    ])
+
+
+WRITERS = {"eav": write_eav, "jsonb": write_jsonb}
+
+
+def timed_writes(layout: str, batches: list[list[dict]]) -> list[float]:
+    """Write and commit each batch; returns the latency of each in ms"""
+    from backend import db_context
+
+    latencies = []
+    for batch in batches:
+        with db_context() as db:
+            start = time.perf_counter()
+            WRITERS[layout](db, batch)
+            db.commit()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def table_sizes(db, tables: list[str]) -> dict:
+    sizes = {"rows": 0, "table_bytes": 0, "index_bytes": 0, "total_bytes": 0}
+    for table in tables:
+        sizes["rows"] += db.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+        row = db.execute(text(
+            "SELECT pg_relation_size(:t), pg_indexes_size(:t), pg_total_relation_size(:t)"
+        ), {"t": table}).one()
+        sizes["table_bytes"] += row[0]
+        sizes["index_bytes"] += row[1]
+        sizes["total_bytes"] += row[2]
+    sizes["total_mb"] = round(sizes["total_bytes"] / 1e6, 1)
+    return sizes
+
+
+def summarize(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+    }
+
+
+def run(responses: int, fields: int, null_rate: float, batch_size: int, single_writes: int, reads: int, seed: int) -> dict:
+    from backend import db_context
+
+    with db_context() as db:
+        db.execute(text(DROP_TABLES))
+        for statement in CREATE_TABLES:
+            db.execute(text(statement))
+        for statements in CREATE_FIELD_INDEXES.values():
+            for statement in statements:
+                for field_id in range(1, fields + 1):
+                    db.execute(text(statement.format(field_id=field_id)))
+        db.commit()
+
+    results = {}
+    try:
+        for layout in ("eav", "jsonb"):
+            layout_rng = random.Random(seed)  # Same values for both layouts
+            batches = [
+                [synthetic_values(layout_rng, fields, null_rate) for _ in range(min(batch_size, responses - start))]
+                for start in range(0, responses, batch_size)
+            ]
+            batch_latencies = timed_writes(layout, batches)
+            single_latencies = timed_writes(layout, [[synthetic_values(layout_rng, fields, null_rate)] for _ in range(single_writes)])
+
+            tables = ["bench_eav_response", "bench_eav_value"] if layout == "eav" else ["bench_jsonb_response"]
+            with db_context() as db:
+                for table in tables:
+                    db.execute(text(f"ANALYZE {table}"))
+                db.commit()
+                sizes = table_sizes(db, tables)
+
+            read_rng = random.Random(seed)
+            read_results = {}
+            with db_context() as db:
+                for name, query in READ_QUERIES[layout].items():
+                    latencies = []
+                    for _ in range(reads):
+                        params = {"id": read_rng.randint(1, responses), "field_id": read_rng.randint(1, fields), "q": read_rng.choice(WORDS)}
+                        start = time.perf_counter()
+                        db.execute(text(query.format(field_id=params["field_id"])), params).all()
+                        latencies.append((time.perf_counter() - start) * 1000)
+                    read_results[name] = summarize(latencies)
+
+            results[layout] = {
+                "sizes": sizes,
+                "write_single_response": summarize(single_latencies),
+                f"write_batch_of_{batch_size}": summarize(batch_latencies),
+                "read": read_results,
+            }
+            print(f"Measured {layout} layout")
+    finally:
+        with db_context() as db:
+            db.execute(text(DROP_TABLES))
+            db.commit()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the EAV and JSONB layouts for extracted field values")
+    parser.add_argument("--responses", type=int, default=100000)
+    parser.add_argument("--fields", type=int, default=25, help="Fields per response (the length of fields_for_extraction)")
+    parser.add_argument("--null-rate", type=float, default=0.5, help="Fraction of fields extracted as not found")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--single-writes", type=int, default=500, help="Single-response writes timed after the bulk fill")
+    parser.add_argument("--reads", type=int, default=500, help="Timed executions of each read query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="field_storage.json")
+    args = parser.parse_args()
+
+    results = run(args.responses, args.fields, args.null_rate, args.batch_size, args.single_writes, args.reads, args.seed)
+    with open(args.output, "w") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(json.dumps(results, indent=2))
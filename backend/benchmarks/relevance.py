@@ -0,0 +1,184 @@
+"""Measure the relevance prefilter (backend.relevance) on a labeled sample.
+
+Labels are the fields each text actually addresses (its non-null fields). They come from a JSONL file of
+{"experience": ..., "fields": {field name: value or null}} records, or from the stored extractions of the most
+recent experiences. The script reports, for each threshold of --thresholds:
+- recall: the fraction of labeled fields the prefilter keeps (a dropped labeled field is lost content), and
+- the fraction of fields and of text characters sent on to the LLM.
+This only needs embeddings calls. Unless --skip-extraction is given, it then extracts every text with and without
+the prefilter (at --threshold) and reports tokens, latency, and end-to-end recall (labeled fields that come back
+non-null). With --fake, a local fake server stands in for OpenAI; it checks the plumbing, but its recall means
+nothing. Run from the repository root, e.g.:
+    python -m backend.benchmarks.relevance --input labeled.jsonl --output relevance.json
+    python -m backend.benchmarks.relevance --sample 100 --thresholds 0.15,0.2,0.25,0.3 --skip-extraction
+"""
+import argparse
+import json
+import random
+import time
+
+from backend.benchmarks.fake_openai import FakeOpenAIServer, add_config_arguments, config_from_args
+from backend.benchmarks.run import percentile, synthetic_text, use_openai_base_url
+
+
+def load_labeled_sample(input_path: str, sample: int, fake: bool, seed: int) -> list[tuple[str, set]]:
+    """(text, names of the fields it addresses) pairs"""
+    if input_path is not None:
+        with open(input_path) as f:
+            records = [json.loads(line) for line in f if line.strip()][:sample]
+        return [(record["experience"], {field for field, value in record["fields"].items() if value is not None}) for record in records]
+    if fake:
+        from backend import fields_for_extraction
+
+        rng = random.Random(seed)
+        return [(synthetic_text(rng), set(rng.sample(fields_for_extraction, 5))) for _ in range(sample)]
+
+    from backend import db_context
+    from backend.fields import field_names, named_field_values
+    from backend.models import ParsedResponse
+
+    with db_context() as db:
+        names = field_names(db)
+        rows = db.query(ParsedResponse.raw_text, ParsedResponse.field_values) \
+            .filter(ParsedResponse.field_values.isnot(None)) \
+            .order_by(ParsedResponse.created_at.desc()).limit(sample).all()
+    return [
+        (row.raw_text, {field for field, value in named_field_values(row.field_values, names).items() if value is not None})
+        for row in rows
+    ]
+
+
+def recall(kept: int, labeled: int) -> float:
+    return round(kept / labeled, 4) if labeled else None
+
+
+def sweep_thresholds(sample: list[tuple[str, set]], thresholds: list[float]) -> dict:
+    from backend import fields_for_extraction
+    from backend.relevance import field_similarities, select_relevant
+
+    similarities = []
+    embedding_tokens = []
+    for text, _ in sample:
+        call_log = []
+        similarities.append(field_similarities(text, fields_for_extraction, call_log=call_log))
+        embedding_tokens.append(sum(call.get("prompt_tokens") or 0 for call in call_log))
+
+    results = {}
+    for threshold in thresholds:
+        labeled = kept_labeled = kept_fields = kept_chars = total_chars = 0
+        missed = {}
+        for (text, labels), (chunks, text_similarities) in zip(sample, similarities):
+            kept, relevant_text = select_relevant(text, fields_for_extraction, chunks, text_similarities, threshold)
+            labeled += len(labels)
+            kept_labeled += len(labels & set(kept))
+            kept_fields += len(kept)
+            kept_chars += len(relevant_text) if kept else 0
+            total_chars += len(text)
+            for field in labels - set(kept):
+                missed[field] = missed.get(field, 0) + 1
+        results[str(threshold)] = {
+            "recall": recall(kept_labeled, labeled),
+            "fields_kept_fraction": round(kept_fields / (len(sample) * len(fields_for_extraction)), 4) if sample else None,
+            "chars_kept_fraction": round(kept_chars / total_chars, 4) if total_chars else None,
+            "most_missed_fields": dict(sorted(missed.items(), key=lambda item: -item[1])[:5]),
+        }
+    return {
+        "texts": len(sample),
+        "labeled_fields_per_text": round(sum(len(labels) for _, labels in sample) / len(sample), 2) if sample else None,
+        "mean_embedding_tokens_per_text": round(sum(embedding_tokens) / len(embedding_tokens), 1) if embedding_tokens else None,
+        "thresholds": results,
+    }
+
+
+def measure_extraction(sample: list[tuple[str, set]], prefilter: bool) -> dict:
+    from backend.utils import extract_fields
+
+    extractions = []
+    labeled = found = 0
+    for text, labels in sample:
+        call_log = []
+        start = time.perf_counter()
+        try:
+            values = dict(extract_fields(text, call_log=call_log, prefilter=prefilter))
+        except Exception:
+            values = None
+        chat_calls = [call for call in call_log if call.get("tier") != "prefilter"]
+        extractions.append({
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "prompt_tokens": sum(call.get("prompt_tokens") or 0 for call in chat_calls),
+            "completion_tokens": sum(call.get("completion_tokens") or 0 for call in chat_calls),
+            "embedding_tokens": sum(call.get("prompt_tokens") or 0 for call in call_log if call.get("tier") == "prefilter"),
+            "succeeded": values is not None,
+        })
+        if values is not None:
+            labeled += len(labels)
+            found += sum(1 for field in labels if values.get(field) is not None)
+
+    def mean(key):
+        return round(sum(e[key] for e in extractions) / len(extractions), 2) if extractions else None
+
+    latencies = [e["latency_ms"] for e in extractions]
+    return {
+        "extractions": len(extractions),
+        "failures": sum(1 for e in extractions if not e["succeeded"]),
+        "recall": recall(found, labeled),
+        "mean_prompt_tokens": mean("prompt_tokens"),
+        "mean_completion_tokens": mean("completion_tokens"),
+        "mean_embedding_tokens": mean("embedding_tokens"),
+        "latency_ms": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the relevance prefilter on a labeled sample")
+    parser.add_argument("--input", default=None, help="JSONL file of {\"experience\": ..., \"fields\": {...}} records")
+    parser.add_argument("--sample", type=int, default=50, help="Number of texts")
+    parser.add_argument("--thresholds", default="0.15,0.2,0.25,0.3,0.35", help="Comma-separated thresholds to sweep")
+    parser.add_argument("--threshold", type=float, default=None, help="Threshold for the extraction comparison (defaults to RELEVANCE_THRESHOLD)")
+    parser.add_argument("--skip-extraction", action="store_true", help="Only sweep thresholds (embeddings calls only)")
+    parser.add_argument("--fake", action="store_true", help="Use a local fake OpenAI server and synthetic texts")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    from backend import relevance
+
+    fake_server = None
+    if args.fake:
+        fake_server = FakeOpenAIServer(config_from_args(args)).start()
+        use_openai_base_url(fake_server.base_url)
+    if args.threshold is not None:
+        relevance.RELEVANCE_THRESHOLD = args.threshold
+    try:
+        sample = load_labeled_sample(args.input, args.sample, args.fake, args.seed)
+        results = {"sweep": sweep_thresholds(sample, [float(threshold) for threshold in args.thresholds.split(",")])}
+        if not args.skip_extraction:
+            results["threshold"] = relevance.RELEVANCE_THRESHOLD
+            results["without_prefilter"] = measure_extraction(sample, prefilter=False)
+            results["with_prefilter"] = measure_extraction(sample, prefilter=True)
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+
+    if not args.skip_extraction:
+        def reduction(key, nested=None):
+            old, new = results["without_prefilter"][key], results["with_prefilter"][key]
+            if nested is not None:
+                old, new = old[nested], new[nested]
+            return round((old - new) / old * 100, 1) if old else None
+
+        results["prefilter_reduction_pct"] = {
+            "prompt_tokens": reduction("mean_prompt_tokens"),
+            "completion_tokens": reduction("mean_completion_tokens"),
+            "latency_p50": reduction("latency_ms", "p50"),
+            "latency_p95": reduction("latency_ms", "p95"),
+        }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
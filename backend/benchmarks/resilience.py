@@ -0,0 +1,151 @@
+"""Check the OpenAI resilience layer (backend.llm_resilience) against the local fake server.
+
+Runs three scenarios, each against a fresh fake server and fresh breaker/latency state:
+- deadline: a server slower than the deadline must fail with LlmDeadlineExceeded close to the deadline
+- hedging: with a slow tail, hedged requests must cut tail latency compared to the same load unhedged
+- circuit_breaker: a failing server must open the breaker (then fail fast or use the fallback model), and a
+  probe after the cooldown must close it again
+Prints the measurements and whether each check passed, and exits with status 1 if any failed. No database is
+needed, but importing the backend requires its usual environment variables. Run from the repository root:
+    python -m backend.benchmarks.resilience --output resilience.json
+"""
+import argparse
+import json
+import sys
+import time
+
+from backend.benchmarks.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from backend.benchmarks.run import percentile, use_openai_base_url
+
+
+def reset_state() -> None:
+    from backend import llm_resilience
+
+    llm_resilience.latency_tracker = llm_resilience.LatencyTracker()
+    llm_resilience._breakers.clear()
+
+
+def timed_call(model: str = "fake-model", deadline_seconds: float = None) -> tuple[float, dict, str]:
+    """One open_ai_llm_call; returns (seconds, its call record, name of the exception raised or None)"""
+    from backend.utils import open_ai_llm_call
+
+    call_log = []
+    start = time.perf_counter()
+    try:
+        open_ai_llm_call("Say hi", model=model, call_log=call_log, deadline=time.monotonic() + deadline_seconds if deadline_seconds else None)
+        error = None
+    except Exception as e:
+        error = type(e).__name__
+    return time.perf_counter() - start, call_log[-1] if call_log else {}, error
+
+
+def with_server(config: FakeOpenAIConfig):
+    server = FakeOpenAIServer(config).start()
+    use_openai_base_url(server.base_url)
+    reset_state()
+    return server
+
+
+def deadline_scenario() -> dict:
+    server = with_server(FakeOpenAIConfig(latency_ms=3000, jitter_ms=0))
+    try:
+        elapsed, _, error = timed_call(deadline_seconds=1.0)
+    finally:
+        server.stop()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "error": error,
+        "checks": {
+            "raises_deadline_exceeded": error == "LlmDeadlineExceeded",
+            "returns_within_deadline_plus_250ms": elapsed < 1.25,
+        },
+    }
+
+
+def hedging_scenario(calls: int) -> dict:
+    from backend import llm_resilience
+
+    results = {}
+    for mode, hedge_percentile in (("unhedged", 0.0), ("hedged", 0.95)):
+        server = with_server(FakeOpenAIConfig(latency_ms=100, jitter_ms=20, tail_rate=0.03, tail_latency_ms=4000, seed=7))
+        original_percentile = llm_resilience.LLM_HEDGE_PERCENTILE
+        llm_resilience.LLM_HEDGE_PERCENTILE = hedge_percentile
+        try:
+            for _ in range(llm_resilience.HEDGE_MIN_SAMPLES):  # Let the tracker learn the latency distribution
+                timed_call()
+            samples = [timed_call() for _ in range(calls)]
+        finally:
+            llm_resilience.LLM_HEDGE_PERCENTILE = original_percentile
+            server.stop()
+        latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+        results[mode] = {
+            "p50_ms": round(percentile(latencies, 0.5), 1),
+            "p99_ms": round(percentile(latencies, 0.99), 1),
+            "max_ms": round(max(latencies), 1),
+            "hedged_fraction": round(sum(1 for _, record, _ in samples if record.get("hedged")) / len(samples), 3),
+            "errors": sum(1 for _, _, error in samples if error is not None),
+        }
+    results["checks"] = {
+        "p99_reduced_by_half": results["hedged"]["p99_ms"] < results["unhedged"]["p99_ms"] / 2,
+        "hedged_at_most_max_fraction": results["hedged"]["hedged_fraction"] <= llm_resilience.HEDGE_MAX_FRACTION + 0.05,
+        "no_errors": results["hedged"]["errors"] == 0 and results["unhedged"]["errors"] == 0,
+    }
+    return results
+
+
+def circuit_breaker_scenario() -> dict:
+    from backend import llm_resilience
+
+    config = FakeOpenAIConfig(latency_ms=20, jitter_ms=0, error_rate=1.0)
+    server = with_server(config)
+    original = (llm_resilience.LLM_FALLBACK_MODEL, llm_resilience.BREAKER_COOLDOWN_SECONDS)
+    llm_resilience.BREAKER_COOLDOWN_SECONDS = 1.0
+    try:
+        failures = [timed_call() for _ in range(llm_resilience.BREAKER_MIN_CALLS)]
+        open_elapsed, _, open_error = timed_call()
+
+        # The provider recovers, but the breaker stays open until the cooldown ends
+        config.error_rate = 0.0
+        llm_resilience.LLM_FALLBACK_MODEL = "fake-fallback-model"
+        _, fallback_record, fallback_error = timed_call()
+        llm_resilience.LLM_FALLBACK_MODEL = ""
+
+        time.sleep(llm_resilience.BREAKER_COOLDOWN_SECONDS)
+        _, probe_record, probe_error = timed_call()
+        _, _, after_probe_error = timed_call()
+    finally:
+        llm_resilience.LLM_FALLBACK_MODEL, llm_resilience.BREAKER_COOLDOWN_SECONDS = original
+        server.stop()
+    return {
+        "failed_calls_before_open": sum(1 for _, _, error in failures if error is not None),
+        "open_call_ms": round(open_elapsed * 1000, 1),
+        "open_call_error": open_error,
+        "fallback_model_used": fallback_record.get("model"),
+        "checks": {
+            "fails_fast_when_open": open_error == "CircuitOpenError" and open_elapsed < 0.05,
+            "routes_to_fallback_when_open": fallback_error is None and fallback_record.get("model") == "fake-fallback-model",
+            "probe_closes_breaker": probe_error is None and probe_record.get("model") == "fake-model" and after_probe_error is None,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check deadlines, hedging and circuit breaking against a fake OpenAI server")
+    parser.add_argument("--hedge-calls", type=int, default=200, help="Measured calls per hedging mode")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    results = {
+        "deadline": deadline_scenario(),
+        "hedging": hedging_scenario(args.hedge_calls),
+        "circuit_breaker": circuit_breaker_scenario(),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    failed = [f"{scenario}.{check}" for scenario, result in results.items() for check, passed in result["checks"].items() if not passed]
+    if failed:
+        print(f"FAILED: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,168 @@
+"""Full-text search benchmark on a synthetic corpus.
+
+Seeds --experiences synthetic experiences (with field values) owned by one benchmark user, builds their
+search vectors, then times search_experiences() for a set of queries, with and without a field filter and
+across pages, and field_values_page() (the /api/field/values query) at the newest, a random and the oldest point
+of the corpus. Writes p50/p95 latency per query type as JSON. Requires the backend's usual environment;
+point DATABASE_URL at a disposable database. Run from the repository root:
+    python -m backend.benchmarks.search --experiences 300000 --output search.json
+"""
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy import text
+
+from backend.benchmarks.run import BenchData, percentile
+
+VOCABULARY = (
+    "bootstrapped pivot churn pricing subscription marketplace logistics manufacturing inventory retail seasonal "
+    "investor angel seed series valuation dilution cofounder equity burnout hiring remote contractor agency "
+    "enterprise sales outbound inbound partnership distributor wholesale regulation compliance patent lawsuit "
+    "community ambassador newsletter podcast press launch beta waitlist feedback onboarding retention referral "
+    "margin cashflow runway revenue profit loss acquisition shutdown expansion europe asia warehouse shipping "
+    "software hardware mobile platform api integration analytics automation restaurant bakery coffee fitness"
+).split()
+FILLER = "we the our a to and of in for with after before during then but it was were had".split()
+QUERIES = {
+    "single_term": ["pricing", "burnout", "distributor", "patent", "runway"],
+    "two_terms": ["seed valuation", "retail inventory", "remote hiring", "churn retention"],
+    "phrase": ['"angel investor"', '"supply chain"', '"pricing experiment"'],
+    "rare_term": ["xylophonic", "bakery lawsuit europe"],
+}
+
+
+def synthetic_document(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) if rng.random() < 0.4 else rng.choice(FILLER) for _ in range(words))
+
+
+def seed_corpus(data: BenchData, experiences: int, values_per_experience: int, seed: int, chunk_size: int = 5000) -> None:
+    from backend import db_context, fields_for_extraction
+    from backend.fields import create_field_indexes
+    from backend.models import ParsedResponse
+    from backend.reextract import get_or_create_parse_fields
+    from backend.search import refresh_search_vectors
+
+    rng = random.Random(seed)
+    with db_context() as db:
+        field_ids = list(get_or_create_parse_fields(db, fields_for_extraction).values())
+        user_id, _ = data.create_user(db)
+        db.commit()
+
+    inserted = 0
+    while inserted < experiences:
+        count = min(chunk_size, experiences - inserted)
+        with db_context() as db:
+            responses = [
+                ParsedResponse(
+                    user_id=user_id,
+                    name=synthetic_document(rng, 4),
+                    raw_text=synthetic_document(rng, rng.randint(80, 600)),
+                    anonymize=False,
+                    field_values={
+                        str(field_id): synthetic_document(rng, 40) for field_id in rng.sample(field_ids, values_per_experience)
+                    }
+                )
+                for _ in range(count)
+            ]
+            db.bulk_save_objects(responses, return_defaults=True)
+            refresh_search_vectors(db, [response.id for response in responses])
+            db.commit()
+        inserted += count
+        print(f"Seeded {inserted}/{experiences} experiences")
+
+    create_field_indexes()
+    with db_context() as db:
+        db.execute(text("ANALYZE parsed_response"))
+        db.commit()
+
+
+def time_queries(repeats: int, field_name: str) -> dict:
+    from backend import db_context
+    from backend.models import ParseField
+    from backend.search import search_experiences
+
+    with db_context() as db:
+        field_id = db.query(ParseField.id).filter(ParseField.name == field_name).scalar()
+
+    results = {}
+    for kind, queries in QUERIES.items():
+        for mode in ("all_text", "field_filter", "second_page"):
+            latencies = []
+            for _ in range(repeats):
+                for q in queries:
+                    with db_context() as db:
+                        cursor = None
+                        if mode == "second_page":
+                            _, cursor = search_experiences(db, q, limit=20)
+                            if cursor is None:
+                                continue
+                        start = time.perf_counter()
+                        search_experiences(db, q, field_id=field_id if mode == "field_filter" else None, limit=20, cursor=cursor)
+                        latencies.append((time.perf_counter() - start) * 1000)
+            results[f"{kind}/{mode}"] = {
+                "queries": len(latencies),
+                "p50_ms": percentile(latencies, 0.5),
+                "p95_ms": percentile(latencies, 0.95),
+            }
+    return results
+
+
+def time_field_browse(repeats: int, field_name: str, seed: int) -> dict:
+    """Latency of a page of one field's values, by how deep into the corpus the cursor points"""
+    from sqlalchemy import func
+
+    from backend import db_context
+    from backend.fields import field_values_page
+    from backend.models import ParseField, ParsedResponse
+
+    rng = random.Random(seed)
+    with db_context() as db:
+        field_id = db.query(ParseField.id).filter(ParseField.name == field_name).scalar()
+        min_id, max_id = db.query(func.min(ParsedResponse.id), func.max(ParsedResponse.id)).one()
+
+    cursors = {
+        "newest_page": lambda: None,
+        "random_page": lambda: rng.randint(min_id, max_id),
+        "oldest_page": lambda: min_id + 100,
+    }
+    results = {}
+    for name, cursor in cursors.items():
+        latencies = []
+        for _ in range(repeats * 10):
+            with db_context() as db:
+                start = time.perf_counter()
+                field_values_page(db, field_id, limit=20, cursor=cursor())
+                latencies.append((time.perf_counter() - start) * 1000)
+        results[f"field_browse/{name}"] = {
+            "queries": len(latencies),
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full-text search on a synthetic corpus")
+    parser.add_argument("--experiences", type=int, default=100000)
+    parser.add_argument("--values-per-experience", type=int, default=5, help="Non-null field values per experience")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-data", action="store_true", help="Don't delete the synthetic corpus afterwards")
+    parser.add_argument("--output", default="search_benchmark.json")
+    args = parser.parse_args()
+
+    from backend import fields_for_extraction
+
+    data = BenchData(run_id=f"search-{int(time.time())}")
+    try:
+        seed_corpus(data, args.experiences, args.values_per_experience, args.seed)
+        timings = time_queries(args.repeats, fields_for_extraction[3])
+        timings.update(time_field_browse(args.repeats, fields_for_extraction[3], args.seed))
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": timings}, f, indent=2)
+        print(json.dumps(timings, indent=2))
+    finally:
+        if not args.keep_data:
+            data.cleanup()
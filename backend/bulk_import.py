@@ -0,0 +1,372 @@
+"""Admin bulk import of experiences from a JSONL file.
+
+Each line is a JSON object with "experienceName" and "experience" (and optionally "anonymize"), as accepted by
+/api/experience/submit. Records that duplicate a stored experience are skipped, fields are extracted with at most
+--concurrency LLM calls in flight (all of them backing off when OpenAI returns 429), and each batch is written with
+bulk inserts. Progress is checkpointed, and finished extractions are cached until their batch is written, so
+rerunning the same command resumes an interrupted import without paying for them again. Usage (from the
+repository root):
+    python -m backend.bulk_import archive.jsonl --user-id 42 --concurrency 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from sqlalchemy.orm import Session
+
+from backend import log_message, db_context, fields_for_extraction, DUPLICATE_REUSE_THRESHOLD
+from backend.auth import get_admin_user
+from backend.dedup import minhash, shingles, jaccard, find_near_duplicate, save_signature
+from backend.fields import update_coverage, field_values_for_storage
+from backend.llm_ledger import record_llm_calls
+from backend.llm_resilience import CircuitOpenError
+from backend.models import ParsedResponse, User
+from backend.reextract import get_or_create_parse_fields, save_checkpoint
+from backend.search import refresh_search_vectors
+from backend.utils import extract_fields
+
+router = APIRouter()
+
+IMPORT_DIR = "bulk_imports"  # Uploaded files and their checkpoints, relative to the working directory
+RATE_LIMIT_MAX_ATTEMPTS = 6
+RATE_LIMIT_BASE_DELAY = 2.0  # Seconds; doubled for each consecutive 429
+RATE_LIMIT_MAX_DELAY = 60.0
+
+
+class RateLimitBackoff:
+    """Pause shared by every worker, so a 429 slows all in-flight extractions down rather than just one."""
+
+    def __init__(self, base_delay: float = RATE_LIMIT_BASE_DELAY, max_delay: float = RATE_LIMIT_MAX_DELAY):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.resume_at = 0.0
+        self.consecutive = 0
+
+    def wait(self) -> None:
+        while True:
+            with self.lock:
+                delay = self.resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Push back the shared resume time; honours Retry-After when the server sends it"""
+        with self.lock:
+            self.consecutive += 1
+            delay = retry_after if retry_after is not None else min(self.max_delay, self.base_delay * 2 ** (self.consecutive - 1))
+            delay *= random.uniform(1.0, 1.25)  # Jitter, so workers don't all resume at the same instant
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            return delay
+
+    def succeeded(self) -> None:
+        with self.lock:
+            self.consecutive = 0
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def extract_with_backoff(text: str, backoff: RateLimitBackoff, call_log: list, max_attempts: int = RATE_LIMIT_MAX_ATTEMPTS) -> list[tuple[str, Optional[str]]]:
+    """extract_fields, retried after a shared backoff when it fails because of a 429 (or an open circuit breaker)"""
+    for attempt in range(max_attempts):
+        backoff.wait()
+        try:
+            pairs = extract_fields(text, call_log=call_log)
+        except Exception as e:
+            if not (is_rate_limit_error(e) or isinstance(e, CircuitOpenError)) or attempt == max_attempts - 1:
+                raise
+            delay = backoff.rate_limited(retry_after_seconds(e))
+            log_message(f"OpenAI is rate limiting or failing; pausing extractions for {delay:.1f} s")
+            continue
+        backoff.succeeded()
+        return pairs
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_checkpoint_path(input_path: str) -> str:
+    return f"{input_path}.checkpoint.json"
+
+
+def load_import_checkpoint(path: str, input_hash: str, user_id: int) -> dict:
+    """Load the checkpoint if it was written for the same file and owner, otherwise start over."""
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("input_hash") == input_hash and checkpoint.get("user_id") == user_id:
+            return checkpoint
+        log_message("Input file or owner changed since the last checkpoint; starting over")
+    return {"input_hash": input_hash, "user_id": user_id, "next_line": 0, "imported": 0, "duplicates": [], "failed": [], "finished": False}
+
+
+def load_cached_extractions(path: str) -> dict[int, dict]:
+    """Extractions finished after the last checkpoint, by line number (a torn last line is ignored)"""
+    cached = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                cached[entry["line"]] = entry
+    return cached
+
+
+def parse_record(line: str) -> dict:
+    record = json.loads(line)
+    if not isinstance(record, dict) or not isinstance(record.get("experience"), str) or not record["experience"].strip():
+        raise ValueError("Record must be an object with a non-empty \"experience\" string")
+    name = record.get("experienceName")
+    if name is not None and (not isinstance(name, str) or len(name) > 200):
+        raise ValueError("\"experienceName\" must be a string of at most 200 characters")
+    if len(record["experience"]) > 20000:
+        raise ValueError("\"experience\" must be at most 20000 characters")
+    return {"name": name, "text": record["experience"], "anonymize": bool(record.get("anonymize", False))}
+
+
+def read_batches(input_path: str, start_line: int, batch_size: int):
+    """Yield lists of (line number, record or None, error or None), skipping blank lines"""
+    batch = []
+    with open(input_path) as f:
+        for line_number, line in enumerate(f):
+            if line_number < start_line or not line.strip():
+                continue
+            try:
+                batch.append((line_number, parse_record(line), None))
+            except (ValueError, TypeError) as e:
+                batch.append((line_number, None, str(e)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def find_duplicates(db: Session, user_id: int, records: list[tuple[int, dict]]) -> tuple[list, list]:
+    """
+    Split records into new ones and near duplicates, of a stored experience of user_id or of an earlier record in the batch
+    :return: (list of (line, record, signature), list of {"line", "duplicate_of"})
+    """
+    new_records, duplicates = [], []
+    batch_shingles = []
+    for line_number, record in records:
+        text_shingles = shingles(record["text"])
+        signature = minhash(text_shingles)
+        match = find_near_duplicate(db, record["text"], signature, user_id)
+        if match is not None and match.similarity >= DUPLICATE_REUSE_THRESHOLD:
+            duplicates.append({"line": line_number, "duplicate_of": match.parsed_response_id})
+            continue
+        earlier = next((line for line, other in batch_shingles if jaccard(text_shingles, other) >= DUPLICATE_REUSE_THRESHOLD), None)
+        if earlier is not None:
+            duplicates.append({"line": line_number, "duplicate_of_line": earlier})
+            continue
+        batch_shingles.append((line_number, text_shingles))
+        new_records.append((line_number, record, signature))
+    return new_records, duplicates
+
+
+def write_batch(db: Session, user_id: int, field_ids: dict[str, int], extracted: list[tuple[dict, list, list, list]]) -> list[int]:
+    """
+    Insert a batch of extracted experiences with bulk statements. The caller is responsible for committing
+    :param extracted: list of (record, signature, field_response_pairs, call_log)
+    :return: ids of the new ParsedResponses
+    """
+    responses = [
+        ParsedResponse(
+            user_id=user_id,
+            name=record["name"],
+            raw_text=record["text"],
+            anonymize=record["anonymize"],
+            field_values=field_values_for_storage(field_ids, pairs)
+        )
+        for record, _, pairs, _ in extracted
+    ]
+    db.bulk_save_objects(responses, return_defaults=True)
+    response_ids = [response.id for response in responses]
+    refresh_search_vectors(db, response_ids)
+    update_coverage(db, response_ids, sign=1)
+    for response, (_, signature, _, call_log) in zip(responses, extracted):
+        save_signature(db, response.id, signature)
+        record_llm_calls(db, call_log, str(uuid.uuid4()), user_id=user_id, parsed_response_id=response.id)
+    return response_ids
+
+
+def bulk_import(
+        input_path: str,
+        user_id: int,
+        batch_size: int = 50,
+        concurrency: int = 4,
+        checkpoint_path: Optional[str] = None
+) -> dict:
+    """
+    Import every record of a JSONL file as an experience owned by user_id
+    :param input_path: JSONL file of {"experienceName", "experience", "anonymize"} records
+    :param user_id: id of the User who will own the imported experiences
+    :param batch_size: number of lines deduplicated, extracted and inserted per batch
+    :param concurrency: maximum number of concurrent LLM calls
+    :param checkpoint_path: file used to resume an interrupted import (defaults to <input_path>.checkpoint.json)
+    :return: the final checkpoint dict
+    """
+    checkpoint_path = checkpoint_path or default_checkpoint_path(input_path)
+    cache_path = f"{checkpoint_path}.extractions.jsonl"
+    checkpoint = load_import_checkpoint(checkpoint_path, file_hash(input_path), user_id)
+    if checkpoint["finished"]:
+        return checkpoint
+    cached = load_cached_extractions(cache_path)
+    if cached:
+        log_message(f"Reusing {len(cached)} extractions finished before the import was interrupted")
+    with db_context() as db:
+        field_ids = get_or_create_parse_fields(db, fields_for_extraction)
+
+    backoff = RateLimitBackoff()
+    cache_lock = threading.Lock()
+
+    def run_one(item):
+        line_number, record, signature = item
+        if line_number in cached:
+            return item, cached[line_number]["pairs"], cached[line_number]["call_log"], None
+        call_log = []
+        try:
+            pairs = extract_with_backoff(record["text"], backoff, call_log)
+        except Exception as e:
+            log_message(f"Extraction failed for line {line_number} of {input_path}: {str(e)}", error=True)
+            return item, None, call_log, str(e)
+        with cache_lock, open(cache_path, "a") as f:
+            f.write(json.dumps({"line": line_number, "pairs": pairs, "call_log": call_log}) + "\n")
+        return item, pairs, call_log, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in read_batches(input_path, checkpoint["next_line"], batch_size):
+            checkpoint["failed"].extend({"line": line, "error": error} for line, _, error in batch if error is not None)
+            with db_context() as db:
+                new_records, duplicates = find_duplicates(db, user_id, [(line, record) for line, record, error in batch if error is None])
+            checkpoint["duplicates"].extend(duplicates)
+
+            extracted = []
+            failed_calls = []
+            for (line_number, record, signature), pairs, call_log, error in executor.map(run_one, new_records):
+                if pairs is None:
+                    checkpoint["failed"].append({"line": line_number, "error": error})
+                    failed_calls.append(call_log)
+                else:
+                    extracted.append((record, signature, [tuple(pair) for pair in pairs], call_log))
+
+            with db_context() as db:
+                if extracted:
+                    write_batch(db, user_id, field_ids, extracted)
+                for call_log in failed_calls:
+                    record_llm_calls(db, call_log, str(uuid.uuid4()), user_id=user_id)
+                try:
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    log_message(f"Failed to write imported experiences: {str(e)}", error=True)
+                    raise
+            checkpoint["imported"] += len(extracted)
+            checkpoint["next_line"] = batch[-1][0] + 1
+            save_checkpoint(checkpoint_path, checkpoint)
+            # Everything cached so far is now in the database (or was abandoned as a duplicate)
+            cached.clear()
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            log_message(f"Import progress: next_line={checkpoint['next_line']}, imported={checkpoint['imported']}, "
+                        f"duplicates={len(checkpoint['duplicates'])}, failed={len(checkpoint['failed'])}")
+
+    checkpoint["finished"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+
+@router.post("/api/admin/import")
+async def api_bulk_import(request: Request, background_tasks: BackgroundTasks, userId: int = None, concurrency: int = 4):
+    """
+    Admin only. Import a JSONL request body (one experience per line) in the background.
+    - userId: Optional[int] - owner of the imported experiences (defaults to the admin)
+    - concurrency: Optional[int] - maximum concurrent LLM calls
+    """
+    with db_context() as db:
+        admin = await get_admin_user(request=request, db=db)
+        owner_id = userId if userId is not None else admin.id
+        if db.query(User.id).filter(User.id == owner_id).scalar() is None:
+            raise HTTPException(status_code=404, detail="No such user exists")
+    body = await request.body()
+    if not body.strip():
+        raise HTTPException(status_code=400, detail="Empty import")
+
+    import_id = str(uuid.uuid4())
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    input_path = os.path.join(IMPORT_DIR, f"{import_id}.jsonl")
+    with open(input_path, "wb") as f:
+        f.write(body)
+    background_tasks.add_task(bulk_import, input_path, owner_id, concurrency=max(1, min(concurrency, 16)))
+    line_count = body.strip().count(b"\n") + 1
+    log_message(f"Bulk import {import_id} of {line_count} lines scheduled by admin {admin.id} for user {owner_id}")
+    return {"import_id": import_id}
+
+
+@router.get("/api/admin/import/{import_id}")
+async def api_bulk_import_status(request: Request, import_id: str):
+    """Admin only. Progress of a bulk import started through /api/admin/import"""
+    with db_context() as db:
+        await get_admin_user(request=request, db=db)
+    try:
+        uuid.UUID(import_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="No such import exists")
+    input_path = os.path.join(IMPORT_DIR, f"{import_id}.jsonl")
+    if not os.path.exists(input_path):
+        raise HTTPException(status_code=404, detail="No such import exists")
+    checkpoint_path = default_checkpoint_path(input_path)
+    if not os.path.exists(checkpoint_path):
+        return {"import_id": import_id, "next_line": 0, "imported": 0, "duplicates": 0, "failed": [], "finished": False}
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    return {
+        "import_id": import_id,
+        "next_line": checkpoint["next_line"],
+        "imported": checkpoint["imported"],
+        "duplicates": len(checkpoint["duplicates"]),
+        "failed": checkpoint["failed"],
+        "finished": checkpoint["finished"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import experiences from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one {\"experienceName\", \"experience\", \"anonymize\"} record per line")
+    parser.add_argument("--user-id", type=int, required=True, help="Owner of the imported experiences")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent LLM calls")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (defaults to <input>.checkpoint.json)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = bulk_import(args.input, args.user_id, batch_size=args.batch_size, concurrency=args.concurrency, checkpoint_path=args.checkpoint)
+    result["seconds"] = round(time.perf_counter() - start, 1)
+    print(json.dumps(result, indent=2))
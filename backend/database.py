@@ -1,8 +1,10 @@
 """Database initialization and management module."""
 from alembic.config import Config
 from alembic import command
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from pathlib import Path
-from backend import log_message
+from backend import log_message, get_engine
 
 
 def init_db():
@@ -17,9 +19,17 @@ def init_db():
     alembic_cfg.set_main_option('script_location', str(current_dir / "alembic"))
 
     try:
-        # Run the migration
+        # Cheap check first, so processes started after the migration don't load the whole Alembic environment
+        with get_engine().connect() as connection:
+            current_revision = MigrationContext.configure(connection).get_current_revision()
+        head_revision = ScriptDirectory.from_config(alembic_cfg).get_current_head()
+        if current_revision == head_revision:
+            log_message(f"Database already at head revision {head_revision}; skipping migrations")
+            return
+
+        # Run the migration (serialized across processes by an advisory lock in alembic/env.py)
         command.upgrade(alembic_cfg, "head")
         log_message("Database migrations completed successfully!")
     except Exception as e:
         log_message(f"Migration failed: {str(e)}", error=True)
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,176 @@
+"""Near-duplicate detection for submitted experiences.
+
+Each ParsedResponse gets a MinHash signature of its raw_text (TextSignature) and one LSH bucket per band
+(LshBucket), so candidates are found with an index lookup instead of a scan. Only the submitting user's own
+experiences are candidates, so nobody is told about (or reuses the extraction of) someone else's text. Usage (from the repository root),
+to sign experiences stored before this existed:
+    python -m backend.dedup --backfill
+"""
+import argparse
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from backend import log_message, db_context, fields_for_extraction, DUPLICATE_FLAG_THRESHOLD, DUPLICATE_REUSE_THRESHOLD
+from backend.fields import field_names, named_field_values
+from backend.models import LshBucket, ParsedResponse, TextSignature
+
+# Changing any of these invalidates stored signatures (re-run the backfill after clearing text_signature)
+SHINGLE_SIZE = 3  # Words per shingle
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands of 4 rows: pairs with Jaccard similarity ~0.5 have even odds of sharing a bucket
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+MAX_CANDIDATES = 20
+
+MINHASH_PRIME = np.uint64(4294967311)  # Smallest prime above 2^32; (a * x + b) stays below 2^64
+_rng = np.random.RandomState(1729)  # Fixed seed: signatures must be comparable across processes and deploys
+MINHASH_A = _rng.randint(1, 2 ** 32 - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+MINHASH_B = _rng.randint(0, 2 ** 32 - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+@dataclass
+class DuplicateMatch:
+    parsed_response_id: int
+    similarity: float  # Exact Jaccard similarity of the two texts' shingle sets
+
+
+def shingles(text: str) -> set[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text_shingles: set[str]) -> Optional[list[int]]:
+    """MinHash signature of a shingle set, or None if the set is empty."""
+    if not text_shingles:
+        return None
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in text_shingles],
+        dtype=np.uint64
+    )
+    permuted = (np.outer(hashes, MINHASH_A) + MINHASH_B) % MINHASH_PRIME
+    return [int(v) for v in permuted.min(axis=0)]
+
+
+def lsh_buckets(signature: list[int]) -> list[tuple[int, int]]:
+    """(band, bucket) pairs for a signature; bucket is a signed 64-bit hash of the band's rows."""
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def find_near_duplicate(
+        db: Session,
+        text: str,
+        signature: Optional[list[int]],
+        user_id: int,
+        exclude_id: Optional[int] = None
+) -> Optional[DuplicateMatch]:
+    """
+    Find the experience of user_id most similar to text, if it is at least DUPLICATE_FLAG_THRESHOLD similar
+    :param db: database session
+    :param text: submitted text
+    :param signature: minhash(shingles(text))
+    :param user_id: id of the submitting User; only their experiences are candidates
+    :param exclude_id: ParsedResponse to ignore (e.g. the one being edited)
+    :return: the best match, or None
+    """
+    if signature is None:
+        return None
+    query = db.query(LshBucket.parsed_response_id, func.count().label("shared_bands")) \
+        .join(ParsedResponse, ParsedResponse.id == LshBucket.parsed_response_id) \
+        .filter(tuple_(LshBucket.band, LshBucket.bucket).in_(lsh_buckets(signature)), ParsedResponse.user_id == user_id)
+    if exclude_id is not None:
+        query = query.filter(LshBucket.parsed_response_id != exclude_id)
+    candidate_ids = [row.parsed_response_id for row in query.group_by(LshBucket.parsed_response_id)
+                     .order_by(func.count().desc()).limit(MAX_CANDIDATES)]
+    if not candidate_ids:
+        return None
+
+    # Rank candidates by estimated similarity, then confirm the best one against its actual text
+    signature_array = np.array(signature)
+    estimates = sorted(
+        ((float(np.mean(np.array(candidate.minhash) == signature_array)), candidate.parsed_response_id)
+         for candidate in db.query(TextSignature).filter(TextSignature.parsed_response_id.in_(candidate_ids))),
+        reverse=True
+    )
+    if not estimates or estimates[0][0] < DUPLICATE_FLAG_THRESHOLD:
+        return None
+    best_id = estimates[0][1]
+    best_text = db.query(ParsedResponse.raw_text).filter(ParsedResponse.id == best_id).scalar()
+    similarity = jaccard(shingles(text), shingles(best_text or ""))
+    if similarity < DUPLICATE_FLAG_THRESHOLD:
+        return None
+    return DuplicateMatch(parsed_response_id=best_id, similarity=similarity)
+
+
+def stored_field_values(db: Session, parsed_response_id: int) -> dict[str, Optional[str]]:
+    """Field name -> value for a stored experience."""
+    field_values = db.query(ParsedResponse.field_values).filter(ParsedResponse.id == parsed_response_id).scalar()
+    return named_field_values(field_values, field_names(db))
+
+
+def reusable_extraction(db: Session, match: Optional[DuplicateMatch]) -> Optional[dict[str, Optional[str]]]:
+    """Stored field values of the match if it is similar enough to reuse instead of extracting from scratch."""
+    if match is None or match.similarity < DUPLICATE_REUSE_THRESHOLD:
+        return None
+    values = stored_field_values(db, match.parsed_response_id)
+    return {field: values[field] for field in fields_for_extraction if field in values}
+
+
+def save_signature(db: Session, parsed_response_id: int, signature: Optional[list[int]]) -> None:
+    """Replace the stored signature and LSH buckets of a response. The caller is responsible for committing"""
+    db.query(LshBucket).filter(LshBucket.parsed_response_id == parsed_response_id).delete(synchronize_session=False)
+    db.query(TextSignature).filter(TextSignature.parsed_response_id == parsed_response_id).delete(synchronize_session=False)
+    if signature is None:
+        return
+    db.add(TextSignature(parsed_response_id=parsed_response_id, minhash=signature))
+    db.bulk_insert_mappings(LshBucket, [
+        {"band": band, "bucket": bucket, "parsed_response_id": parsed_response_id}
+        for band, bucket in lsh_buckets(signature)
+    ])
+
+
+def backfill_signatures(batch_size: int = 500) -> int:
+    """Sign every ParsedResponse that has no TextSignature yet; returns the number signed."""
+    signed = 0
+    last_id = 0
+    while True:
+        with db_context() as db:
+            rows = db.query(ParsedResponse.id, ParsedResponse.raw_text) \
+                .outerjoin(TextSignature, TextSignature.parsed_response_id == ParsedResponse.id) \
+                .filter(TextSignature.parsed_response_id.is_(None), ParsedResponse.id > last_id) \
+                .order_by(ParsedResponse.id).limit(batch_size).all()
+            if not rows:
+                return signed
+            for row in rows:
+                save_signature(db, row.id, minhash(shingles(row.raw_text)))
+            db.commit()
+        signed += len(rows)
+        last_id = rows[-1].id
+        log_message(f"Signed {signed} experiences")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate detection maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Sign experiences that have no signature yet")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.backfill:
+        print(f"Signed {backfill_signatures(args.batch_size)} experiences")
+    else:
+        parser.print_help()
@@ -6,5 +6,8 @@ cd /app/backend
 alembic upgrade head
 cd /app
 
+# Migrations are done; don't repeat them in every gunicorn worker
+export RUN_MIGRATIONS=0
+
 # Start the application wth a 30 second worker timeout
 exec gunicorn backend:create_app --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 --timeout 30 --limit-request-line 8190
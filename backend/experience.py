@@ -1,13 +1,24 @@
 from dotenv import load_dotenv
 import json
+import time
+import uuid
+from typing import Optional
 from backend import log_message
 from backend.auth import get_current_user
-from backend.models import ParseField, ParseFieldValue, ParsedResponse
+from backend.models import ParseField, ParsedResponse, User
 from backend.utils import user_can_perform_limited_action
-from fastapi import APIRouter, Request, HTTPException
-from backend import db_context
+from fastapi import APIRouter, Request, Response, HTTPException
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from backend import db_context, read_db_context, pin_to_primary, fields_for_extraction, LLM_DEADLINE_SECONDS
 
 from backend.utils import extract_fields
+from backend.llm_resilience import LlmDeadlineExceeded, CircuitOpenError
+from backend.llm_ledger import record_llm_calls, save_llm_calls
+from backend.search import refresh_search_vectors
+from backend.fields import update_coverage, field_values_for_storage, field_names, named_field_values
+from backend.dedup import minhash, shingles, find_near_duplicate, reusable_extraction, save_signature
+from backend.idempotency import request_fingerprint, begin_idempotent_request, complete_idempotency_key, release_idempotency_key
 
 router = APIRouter()
 
@@ -15,21 +26,57 @@ load_dotenv()
 
 
 @router.post("/api/experience/submit")
-async def api_submit_experience(request: Request):
+async def api_submit_experience(request: Request, response: Response):
     """
     Endpoint to submit or edit an experience
-    :param request: Must contain JSON body with keys "experienceName" and "experience". Optional key "existingExperienceId" for editing an existing entry
+    :param request: Must contain JSON body with keys "experienceName" and "experience". Optional key "existingExperienceId" for editing an existing entry.
+    An optional Idempotency-Key header makes retries of the same request replay its result instead of submitting again
+    :param response: used to pin the client's next reads to the primary, so it sees its submission
     :return: JSON response
     """
     data = await request.json()
+
+    with db_context() as db:
+        current_user = await get_current_user(request=request, db=db, optional=False)
+        current_user_id = current_user.id
+
+    # submit_experience blocks (database sessions, LLM calls), so it runs on the threadpool to keep the event loop free
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is None:
+        result = await run_in_threadpool(submit_experience, data, current_user_id)
+        pin_to_primary(response)
+        return result
+    replay = await begin_idempotent_request(current_user_id, idempotency_key, request_fingerprint(data))
+    if replay is not None:
+        pin_to_primary(replay)
+        return replay
+    try:
+        result = await run_in_threadpool(submit_experience, data, current_user_id, idempotency_key=idempotency_key)
+    except Exception:
+        # Not on cancellation: the thread carries on and completes the key (or its claim times out)
+        await run_in_threadpool(release_idempotency_key, current_user_id, idempotency_key)
+        raise
+    pin_to_primary(response)
+    return result
+
+
+def submit_experience(data: dict, current_user_id: int, idempotency_key: Optional[str] = None) -> dict:
+    """
+    Rate-limit, extract and store a submitted experience
+    :param data: request body of api_submit_experience
+    :param current_user_id: id of the submitting user
+    :param idempotency_key: if specified, a key claimed with begin_idempotent_request; the result is stored in it
+    :return: JSON response
+    """
+    # Extraction has to finish within LLM_DEADLINE_SECONDS of the request starting, whatever else it waits on
+    deadline = time.monotonic() + LLM_DEADLINE_SECONDS
     experience_name = data["experienceName"]
     experience = data["experience"]
     anonymize = data.get("anonymize", False)
     existing_response_id = data.get("existingExperienceId")
 
     with db_context() as db:
-        current_user = await get_current_user(request=request, db=db, optional=False)
-        current_user_id = current_user.id
+        current_user = db.query(User).get(current_user_id)
 
         # Enforce rate limits for user
         user_data = current_user.user_data()
@@ -59,10 +106,33 @@ async def api_submit_experience(request: Request):
             )
 
     log_message(f"api_submit_experience() called by user: {current_user} with experience_name: {experience_name}")
+
+    # Look for an earlier near-identical submission before paying for an extraction
+    signature = minhash(shingles(experience))
+    with db_context() as db:
+        duplicate = find_near_duplicate(db, experience, signature, current_user_id, exclude_id=existing_response_id)
+        reused_values = reusable_extraction(db, duplicate)
+    if duplicate is not None:
+        log_message(f"Submission is a near duplicate of ParsedResponse {duplicate.parsed_response_id} (similarity {duplicate.similarity:.2f}, reusing extraction: {reused_values is not None})")
+
+    submission_id = str(uuid.uuid4())
+    llm_calls = []
     try:
-        field_response_pairs = extract_fields(experience)
+        if reused_values is None:
+            field_response_pairs = extract_fields(experience, call_log=llm_calls, deadline=deadline)
+        else:
+            # Only fields the earlier extraction doesn't have (e.g. added since) still need the LLM
+            missing_fields = [field for field in fields_for_extraction if field not in reused_values]
+            extracted = dict(extract_fields(experience, fields=missing_fields, call_log=llm_calls, deadline=deadline)) if missing_fields else {}
+            field_response_pairs = [(field, reused_values[field] if field in reused_values else extracted[field]) for field in fields_for_extraction]
     except Exception as e:
         log_message(f"Failed to extract fields: {str(e)}", error=True)
+        save_llm_calls(llm_calls, submission_id, user_id=current_user_id)
+        if isinstance(e, (LlmDeadlineExceeded, CircuitOpenError)):
+            raise HTTPException(
+                status_code=503,
+                detail="Extraction is temporarily unavailable. Please try again in a minute."
+            )
         raise HTTPException(
             status_code=500,
             detail="Failed to extract fields from response."
@@ -89,6 +159,7 @@ async def api_submit_experience(request: Request):
                         detail="An error occurred on our end."
                     )
             parse_fields.append(parse_field)
+        field_values = field_values_for_storage({parse_field.name: parse_field.id for parse_field in parse_fields}, field_response_pairs)
 
         # Fetch and modify existing ParsedResponse (if we're simply editing) or create a new one and flush it to the database (if we're adding)
         if existing_response_id is not None:
@@ -102,29 +173,45 @@ async def api_submit_experience(request: Request):
             parsed_response.name = experience_name
             parsed_response.raw_text = experience
             parsed_response.anonymize = anonymize
+            update_coverage(db, [parsed_response.id], sign=-1)
+            parsed_response.field_values = field_values
             db.add(parsed_response)
-            for parse_field_value in parsed_response.parse_field_values:
-                db.delete(parse_field_value)
-            db.flush()
         else:
             log_message(f"Adding new ParsedResponse")
             parsed_response = ParsedResponse(
                 user_id=current_user_id,
                 name=experience_name,
                 raw_text=experience,
-                anonymize=anonymize
+                anonymize=anonymize,
+                field_values=field_values
             )
             db.add(parsed_response)
             db.flush()
 
-        # Add ParseFieldValue objects for ParsedResponse
-        for parsed_field, (_, response) in zip(parse_fields, field_response_pairs):
-            parse_field_value = ParseFieldValue(
-                parse_field_id=parsed_field.id,
-                parsed_response_id=parsed_response.id,
-                value=response
-            )
-            db.add(parse_field_value)
+        # Flag near duplicates on the response itself
+        response_data = parsed_response.parsed_response_data()
+        if duplicate is not None:
+            response_data["duplicate_of"] = {"id": duplicate.parsed_response_id, "similarity": round(duplicate.similarity, 3)}
+        else:
+            response_data.pop("duplicate_of", None)
+        parsed_response.parsed_response_json = json.dumps(response_data)
+
+        # Keep the full-text search index, coverage statistics and duplicate signatures current
+        db.flush()
+        refresh_search_vectors(db, [parsed_response.id])
+        update_coverage(db, [parsed_response.id], sign=1)
+        save_signature(db, parsed_response.id, signature)
+
+        # Record the LLM calls that produced this response
+        record_llm_calls(db, llm_calls, submission_id, user_id=current_user_id, parsed_response_id=parsed_response.id)
+
+        # Return JSON with fields_extracted, which maps fields to whether they were found in the submitted text
+        result = {
+            "fields_extracted": {field: response is not None for field, response in field_response_pairs},
+            "duplicate_of": duplicate.parsed_response_id if duplicate is not None else None
+        }
+        if idempotency_key is not None:
+            complete_idempotency_key(db, current_user_id, idempotency_key, 200, result)
 
         # Commit response and field values to database
         try:
@@ -137,10 +224,7 @@ async def api_submit_experience(request: Request):
                 detail="An error occurred on our end."
             )
 
-        # Return JSON with fields_extracted, which maps fields to whether they were found in the submitted text
-        return {
-            "fields_extracted": {field: response is not None for field, response in field_response_pairs}
-        }
+        return result
 
 @router.get("/api/experience")
 async def get_experience(request: Request, experienceId: int = None, userId: int = None, maxNumber: int = None):
@@ -151,7 +235,7 @@ async def get_experience(request: Request, experienceId: int = None, userId: int
     - maxNumber: Optional[int] - limit the number of results if provided
     """
     log_message(f"get_experience called with experienceId: {experienceId}, userId: {userId}, maxNumber: {maxNumber}")
-    with db_context() as db:
+    with read_db_context(request) as db:
         current_user = await get_current_user(request=request, db=db, optional=True)  # TODO: Make this work (not be None)
         log_message(f"Current user: {current_user.id if current_user else None}")
         query = db.query(ParsedResponse)
@@ -163,6 +247,7 @@ async def get_experience(request: Request, experienceId: int = None, userId: int
         if maxNumber is not None:
             query = query.limit(maxNumber)
         results = query.all()
+        names = field_names(db)
 
         result_dicts = []
         for result in results:
@@ -176,7 +261,7 @@ async def get_experience(request: Request, experienceId: int = None, userId: int
                 "raw_text": result.raw_text,
                 "created_at": result.created_at.isoformat(),
                 "updated_at": result.updated_at.isoformat(),
-                "fields_extracted": {parse_field_value.parse_field.name: parse_field_value.value for parse_field_value in result.parse_field_values},
+                "fields_extracted": named_field_values(result.field_values, names),
                 "first_name": result.user.first_name if not anonymize else None,
                 "last_name": result.user.last_name if not anonymize else None,
                 "profile_picture_url": result.user.profile_picture_url if not anonymize else None
@@ -188,17 +273,28 @@ async def get_experience(request: Request, experienceId: int = None, userId: int
 
     return {"results": result_dicts}
 
+def delete_parsed_responses(db: Session, parsed_response_ids: list[int]) -> int:
+    """
+    Delete experiences with a single statement; their field values go with the row, and the database cascades to their embeddings.
+    The caller is responsible for committing
+    :param db: database session
+    :param parsed_response_ids: ids of the ParsedResponses to delete
+    :return: number of deleted ParsedResponses
+    """
+    if not parsed_response_ids:
+        return 0
+    update_coverage(db, parsed_response_ids, sign=-1)
+    return db.query(ParsedResponse).filter(ParsedResponse.id.in_(parsed_response_ids)).delete(synchronize_session=False)
+
 @router.delete("/api/experience")
-async def delete_experience(experienceId: int):
+async def delete_experience(experienceId: int, response: Response):
     log_message(f"delete_experience called with experienceId: {experienceId}")
     with db_context() as db:
-        parsed_response = db.query(ParsedResponse).filter(ParsedResponse.id == experienceId).first()
-        if parsed_response is None:
+        if delete_parsed_responses(db, [experienceId]) == 0:
             raise HTTPException(
                 status_code=404,
                 detail="No such experience entry exists"
             )
-        db.delete(parsed_response)
         try:
             db.commit()
         except Exception as e:
@@ -208,4 +304,5 @@ async def delete_experience(experienceId: int):
                 status_code=500,
                 detail="An error occurred on our end."
             )
+        pin_to_primary(response)
         return {"message": "Experience entry deleted successfully"}
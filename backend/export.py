@@ -0,0 +1,189 @@
+"""Constant-memory export of every experience, flattened with its field values.
+
+Rows are read through a server-side cursor and written out in chunks, so memory use doesn't depend on the
+size of the table. Anonymization is applied as in get_experience (for a viewer who owns nothing). The HTTP
+endpoint is for admins only. Usage (from the repository root):
+    python -m backend.export --format ndjson --output experiences.ndjson
+    python -m backend.export --format parquet --output experiences.parquet  # requires pyarrow
+"""
+import argparse
+import csv
+import io
+import json
+import resource
+import sys
+import time
+from typing import Iterator
+
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from backend import log_message, read_db_context, fields_for_extraction
+from backend.auth import get_admin_user
+from backend.fields import field_names, named_field_values
+from backend.models import ParsedResponse, User
+
+router = APIRouter()
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ["id", "name", "raw_text", "created_at", "updated_at", "user_id", "first_name", "last_name", "profile_picture_url"]
+
+
+def iter_experience_records(db: Session, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Stream every experience as a flat dict, oldest first
+    :param db: database session
+    :param chunk_size: rows fetched from the server-side cursor at a time
+    """
+    names = field_names(db)
+    query = db.query(
+        ParsedResponse.id, ParsedResponse.name, ParsedResponse.raw_text, ParsedResponse.anonymize,
+        ParsedResponse.user_id, ParsedResponse.created_at, ParsedResponse.updated_at,
+        User.first_name, User.last_name, User.profile_picture_url, ParsedResponse.field_values
+    ).join(User, User.id == ParsedResponse.user_id) \
+        .order_by(ParsedResponse.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(chunk_size)
+
+    for row in query:
+        anonymize = row.anonymize
+        yield {
+            "id": row.id,
+            "name": row.name,
+            "raw_text": row.raw_text,
+            "created_at": row.created_at.isoformat(),
+            "updated_at": row.updated_at.isoformat(),
+            "user_id": row.user_id if not anonymize else None,
+            "first_name": row.first_name if not anonymize else None,
+            "last_name": row.last_name if not anonymize else None,
+            "profile_picture_url": row.profile_picture_url if not anonymize else None,
+            "fields": named_field_values(row.field_values, names),
+        }
+
+
+def chunked(records: Iterator[dict], chunk_size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ndjson_chunks(records: Iterator[dict], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    for chunk in chunked(records, chunk_size):
+        yield "".join(json.dumps(record) + "\n" for record in chunk)
+
+
+def csv_chunks(records: Iterator[dict], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """One column per entry of fields_for_extraction, after the experience columns."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS + fields_for_extraction)
+    for chunk in chunked(records, chunk_size):
+        for record in chunk:
+            writer.writerow([record[column] for column in CSV_COLUMNS] + [record["fields"].get(field) for field in fields_for_extraction])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_parquet(records: Iterator[dict], path: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> None:
+    """Write one Parquet row group per chunk; pyarrow is an optional dependency only needed here."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema(
+        [("id", pa.int64()), ("name", pa.string()), ("raw_text", pa.string()), ("created_at", pa.string()),
+         ("updated_at", pa.string()), ("user_id", pa.int64()), ("first_name", pa.string()), ("last_name", pa.string()),
+         ("profile_picture_url", pa.string())]
+        + [(field, pa.string()) for field in fields_for_extraction]
+    )
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunked(records, chunk_size):
+            columns = {column: [record[column] for record in chunk] for column in CSV_COLUMNS}
+            columns.update({field: [record["fields"].get(field) for record in chunk] for field in fields_for_extraction})
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+
+def stream_export(export_format: str) -> Iterator[str]:
+    """Run the export in its own session, for StreamingResponse (which iterates it in a threadpool)."""
+    start = time.perf_counter()
+    exported = 0
+    with read_db_context() as db:
+        def counted():
+            nonlocal exported
+            for record in iter_experience_records(db):
+                exported += 1
+                yield record
+
+        serializer = ndjson_chunks if export_format == "ndjson" else csv_chunks
+        yield from serializer(counted())
+    elapsed = time.perf_counter() - start
+    log_message(f"Exported {exported} experiences as {export_format} in {elapsed:.1f} s ({exported / elapsed if elapsed else 0:.0f}/s)")
+
+
+@router.get("/api/experience/export")
+async def api_export_experiences(request: Request, format: str = "ndjson"):
+    """
+    Admin only. Stream every experience with its field values, anonymized as in get_experience.
+    - format: Optional[str] - "ndjson" (default) or "csv"
+    """
+    with read_db_context(request) as db:
+        await get_admin_user(request=request, db=db)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format; use one of {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        stream_export(format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=experiences.{format}"}
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export every experience with its field values")
+    parser.add_argument("--format", choices=["ndjson", "csv", "parquet"], default="ndjson")
+    parser.add_argument("--output", default=None, help="Output path (defaults to stdout for ndjson/csv)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    exported = 0
+    with read_db_context() as db:
+        def counted():
+            global exported
+            for record in iter_experience_records(db, chunk_size=args.chunk_size):
+                exported += 1
+                yield record
+
+        if args.format == "parquet":
+            if args.output is None:
+                parser.error("--output is required for parquet")
+            write_parquet(counted(), args.output, chunk_size=args.chunk_size)
+        else:
+            serializer = ndjson_chunks if args.format == "ndjson" else csv_chunks
+            out = open(args.output, "w", newline="") if args.output else sys.stdout
+            try:
+                for text in serializer(counted(), chunk_size=args.chunk_size):
+                    out.write(text)
+            finally:
+                if args.output:
+                    out.close()
+
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(json.dumps({
+        "experiences": exported,
+        "seconds": round(elapsed, 2),
+        "experiences_per_second": round(exported / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+    }), file=sys.stderr)
@@ -0,0 +1,284 @@
+import argparse
+import json
+import sys
+from typing import Optional
+
+from fastapi import APIRouter, Request, HTTPException
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+from backend import log_message, db_context, read_db_context, get_engine
+from backend.auth import get_current_user
+from backend.models import FieldStats, ParseField, ParsedResponse, User, UserStats
+
+router = APIRouter()
+
+MAX_FIELD_VALUES = 100
+
+# Merge values into ParsedResponse.field_values (overwriting fields that are already there)
+merge_field_values_sql = text("""
+    UPDATE parsed_response
+    SET field_values = coalesce(field_values, '{}'::jsonb) || CAST(:values AS jsonb)
+    WHERE id = :id
+""")
+
+# Add (sign=1) or subtract (sign=-1) the contribution of some responses to the coverage tables. Rows are
+# written in key order so concurrent submits lock them in the same order
+update_field_stats_sql = text("""
+    INSERT INTO field_stats (parse_field_id, value_count, filled_count)
+    SELECT parse_field_id, :sign * count(*), :sign * count(value)
+    FROM parse_field_value
+    WHERE parsed_response_id IN :ids
+    GROUP BY parse_field_id
+    ORDER BY parse_field_id
+    ON CONFLICT (parse_field_id) DO UPDATE SET
+        value_count = field_stats.value_count + excluded.value_count,
+        filled_count = field_stats.filled_count + excluded.filled_count
+""").bindparams(bindparam("ids", expanding=True))
+
+update_user_stats_sql = text("""
+    INSERT INTO user_stats (user_id, experience_count, filled_value_count)
+    SELECT parsed_response.user_id, :sign * count(DISTINCT parsed_response.id), :sign * count(parse_field_value.value)
+    FROM parsed_response
+    LEFT JOIN parse_field_value ON parse_field_value.parsed_response_id = parsed_response.id
+    WHERE parsed_response.id IN :ids
+    GROUP BY parsed_response.user_id
+    ORDER BY parsed_response.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        experience_count = user_stats.experience_count + excluded.experience_count,
+        filled_value_count = user_stats.filled_value_count + excluded.filled_value_count
+""").bindparams(bindparam("ids", expanding=True))
+
+# Every ParseField has a partial index on parsed_response over the ids of the responses with a non-null value for
+# it, so /api/field/values reads a page in id order. Indexes are built without blocking writes (CREATE INDEX
+# CONCURRENTLY) by a migration for the fields that existed then and by create_field_indexes for fields added later;
+# requests only read them. field_values_page must repeat the predicate exactly, with the key as a literal (psycopg2
+# inlines bound parameters, so ParsedResponse.field_values[key].astext qualifies)
+FIELD_INDEX_PREFIX = "ix_parsed_response_field_"
+create_field_index_sql = """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON parsed_response (id)
+    WHERE (field_values ->> '{field_id}') IS NOT NULL
+"""
+existing_field_indexes_sql = text("""
+    SELECT index_class.relname, pg_index.indisvalid
+    FROM pg_index
+    JOIN pg_class AS index_class ON index_class.oid = pg_index.indexrelid
+    WHERE pg_index.indrelid = 'parsed_response'::regclass
+""")
+
+# Every value of the old one-row-per-value table (kept as parse_field_value_eav until the JSONB values are verified)
+# compared with ParsedResponse.field_values. Values edited or re-extracted since the migration also count as differences
+compare_eav_field_values_sql = text("""
+    SELECT eav.parsed_response_id,
+           NOT (coalesce(parsed_response.field_values, '{}') ? eav.parse_field_id::text) AS missing
+    FROM parse_field_value_eav AS eav
+    JOIN parsed_response ON parsed_response.id = eav.parsed_response_id
+    WHERE NOT (coalesce(parsed_response.field_values, '{}') ? eav.parse_field_id::text)
+       OR (parsed_response.field_values ->> eav.parse_field_id::text) IS DISTINCT FROM eav.value
+""")
+MAX_REPORTED_MISMATCHES = 20
+
+
+def field_index_name(field_id: int) -> str:
+    return f"{FIELD_INDEX_PREFIX}{int(field_id)}_browse"
+
+
+def create_field_indexes() -> list[int]:
+    """
+    Build the browse index of every ParseField that doesn't have a valid one yet, without blocking writes. Run
+    after fields were added (by reextract or by the first submission after a field-list change)
+    :return: ids of the fields that were indexed
+    """
+    with get_engine().connect() as connection:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        valid_by_name = {name: valid for name, valid in connection.execute(existing_field_indexes_sql)}
+        created = []
+        for (field_id,) in connection.execute(text("SELECT id FROM parse_field ORDER BY id")).all():
+            name = field_index_name(field_id)
+            if valid_by_name.get(name):
+                continue
+            if name in valid_by_name:  # Left invalid by a concurrent build that failed part-way
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            log_message(f"Creating index {name}")
+            connection.execute(text(create_field_index_sql.format(name=name, field_id=int(field_id))))
+            created.append(field_id)
+    return created
+
+
+def verify_jsonb_field_values() -> dict:
+    """
+    Check that every value of parse_field_value_eav made it into ParsedResponse.field_values. Run after migrating
+    and before the revision that drops the old table
+    :return: dict with the number of values checked, missing and different, and the first mismatched response ids
+    """
+    with db_context() as db:
+        checked = db.execute(text("SELECT count(*) FROM parse_field_value_eav")).scalar()
+        mismatches = db.execute(compare_eav_field_values_sql).all()
+    return {
+        "checked": checked,
+        "missing": sum(1 for row in mismatches if row.missing),
+        "different": sum(1 for row in mismatches if not row.missing),
+        "mismatched_response_ids": sorted({row.parsed_response_id for row in mismatches})[:MAX_REPORTED_MISMATCHES],
+    }
+
+
+def field_values_for_storage(field_ids: dict[str, int], field_response_pairs: list[tuple[str, Optional[str]]]) -> dict[str, Optional[str]]:
+    """
+    Build a ParsedResponse.field_values object
+    :param field_ids: dict mapping field name to ParseField id
+    :param field_response_pairs: (field name, value or None) pairs, as returned by extract_fields
+    :return: dict mapping str(ParseField id) to value
+    """
+    return {str(field_ids[field]): value for field, value in field_response_pairs}
+
+
+def field_names(db: Session) -> dict[int, str]:
+    """ParseField id -> name, for reading ParsedResponse.field_values"""
+    return {field_id: name for field_id, name in db.query(ParseField.id, ParseField.name)}
+
+
+def named_field_values(field_values: Optional[dict], names: dict[int, str]) -> dict[str, Optional[str]]:
+    """ParsedResponse.field_values keyed by field name, without fields that no longer exist"""
+    return {names[int(key)]: value for key, value in (field_values or {}).items() if int(key) in names}
+
+
+def merge_field_values(db: Session, values_by_response: dict[int, dict[str, Optional[str]]]) -> None:
+    """
+    Add or overwrite some field values of several responses, one UPDATE per response sent as a single batch.
+    The caller is responsible for committing
+    :param db: database session
+    :param values_by_response: dict mapping ParsedResponse id to a field_values_for_storage() object
+    """
+    if values_by_response:
+        db.execute(merge_field_values_sql, [
+            {"id": parsed_response_id, "values": json.dumps(values)}
+            for parsed_response_id, values in values_by_response.items()
+        ])
+
+
+def update_coverage(db: Session, parsed_response_ids: list[int], sign: int) -> None:
+    """
+    Apply the current (flushed) field values of some responses to FieldStats and UserStats. Call with sign=-1
+    before those values are changed or deleted and with sign=1 after they are written, in the same transaction
+    :param db: database session
+    :param parsed_response_ids: ids of the affected responses
+    :param sign: 1 to add their contribution, -1 to remove it
+    """
+    if not parsed_response_ids:
+        return
+    params = {"ids": list(parsed_response_ids), "sign": sign}
+    db.execute(update_field_stats_sql, params)
+    db.execute(update_user_stats_sql, params)
+
+
+def field_values_page(db: Session, field_id: int, limit: int = 20, cursor: Optional[int] = None) -> tuple[list, Optional[int]]:
+    """
+    One page of the non-null values of a field, newest first
+    :param db: database session
+    :param field_id: ParseField id
+    :param limit: page size
+    :param cursor: ParsedResponse id returned with the previous page
+    :return: (list of rows with the value and its experience and user, cursor for the next page or None)
+    """
+    # The field's partial index on id (see create_field_index_sql) yields the responses with a non-null value
+    # newest first, so a page stops after limit + 1 index entries however deep the cursor is
+    value = ParsedResponse.field_values[str(field_id)].astext
+    query = db.query(
+        ParsedResponse.id.label("parsed_response_id"), value.label("value"),
+        ParsedResponse.name, ParsedResponse.user_id, ParsedResponse.anonymize, ParsedResponse.created_at,
+        User.first_name, User.last_name, User.profile_picture_url
+    ).join(User, User.id == ParsedResponse.user_id) \
+        .filter(value.isnot(None))
+    if cursor is not None:
+        query = query.filter(ParsedResponse.id < cursor)
+    rows = query.order_by(ParsedResponse.id.desc()).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].parsed_response_id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+@router.get("/api/field/values")
+async def get_field_values(request: Request, field: str, limit: int = 20, cursor: int = None):
+    """
+    List the non-null values of one field across experiences, newest first.
+    - field: str - name of the ParseField
+    - limit: Optional[int] - page size (at most MAX_FIELD_VALUES)
+    - cursor: Optional[int] - next_cursor from the previous page
+    """
+    log_message(f"get_field_values called with field: {field}, limit: {limit}, cursor: {cursor}")
+    limit = max(1, min(limit, MAX_FIELD_VALUES))
+    with read_db_context(request) as db:
+        current_user = await get_current_user(request=request, db=db, optional=True)
+        field_id = db.query(ParseField.id).filter(ParseField.name == field).scalar()
+        if field_id is None:
+            raise HTTPException(status_code=404, detail="No such field exists")
+
+        rows, next_cursor = field_values_page(db, field_id, limit=limit, cursor=cursor)
+
+    result_dicts = []
+    for row in rows:
+        anonymize = row.anonymize
+        if current_user is not None and current_user.id == row.user_id:  # Owners see their own information
+            anonymize = False
+        result_dicts.append({
+            "experience_id": row.parsed_response_id,
+            "experience_name": row.name,
+            "value": row.value,
+            "created_at": row.created_at.isoformat(),
+            "user_id": row.user_id if not anonymize else None,
+            "first_name": row.first_name if not anonymize else None,
+            "last_name": row.last_name if not anonymize else None,
+            "profile_picture_url": row.profile_picture_url if not anonymize else None
+        })
+    return {"field": field, "results": result_dicts, "next_cursor": next_cursor}
+
+
+@router.get("/api/field/stats")
+async def get_field_stats(request: Request, userId: Optional[int] = None):
+    """
+    Coverage statistics read from the precomputed FieldStats/UserStats tables.
+    - userId: Optional[int] - also return the counts for this user
+    """
+    with read_db_context(request) as db:
+        rows = db.query(ParseField.id, ParseField.name, FieldStats.value_count, FieldStats.filled_count) \
+            .outerjoin(FieldStats, FieldStats.parse_field_id == ParseField.id) \
+            .order_by(ParseField.id).all()
+        result = {
+            "fields": [
+                {
+                    "field_id": row.id,
+                    "field": row.name,
+                    "value_count": row.value_count or 0,
+                    "filled_count": row.filled_count or 0,
+                    "fill_rate": (row.filled_count or 0) / row.value_count if row.value_count else None,
+                }
+                for row in rows
+            ]
+        }
+        if userId is not None:
+            user_stats = db.query(UserStats).filter(UserStats.user_id == userId).first()
+            result["user"] = {
+                "user_id": userId,
+                "experience_count": user_stats.experience_count if user_stats else 0,
+                "filled_value_count": user_stats.filled_value_count if user_stats else 0,
+            }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the per-field indexes on parsed_response")
+    parser.add_argument("--create-indexes", action="store_true", help="Build the browse index of every field that lacks one")
+    parser.add_argument("--verify-jsonb", action="store_true", help="Compare the JSONB field values with the old table")
+    args = parser.parse_args()
+
+    if args.create_indexes:
+        indexed = create_field_indexes()
+        log_message(f"Created browse indexes for {len(indexed)} fields: {indexed}")
+    elif args.verify_jsonb:
+        report = verify_jsonb_field_values()
+        print(json.dumps(report, indent=2))
+        if report["missing"] or report["different"]:
+            print(f"FAILED: {report['missing']} values missing and {report['different']} different in field_values", file=sys.stderr)
+            sys.exit(1)
+    else:
+        parser.print_help()
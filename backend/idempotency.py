@@ -0,0 +1,136 @@
+"""Idempotency-Key support for experience submission.
+
+The first request with a key claims it by inserting an IdempotencyKey row (with a null status_code) and stores its
+result in that row in the same transaction as the experience itself. Later requests with the same key get the
+stored result replayed; ones that arrive while the first is still running poll the row until it completes. The row
+lives in the database so this holds across workers.
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from backend import log_message, db_context, IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_WAIT_SECONDS
+from backend.models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL_SECONDS = 0.5
+# A claim this old without a result belongs to a request that died (extraction takes well under this)
+IN_FLIGHT_TIMEOUT = timedelta(minutes=10)
+
+
+def request_fingerprint(data: dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def claim_idempotency_key(db: Session, user_id: int, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+    """
+    Try to become the request that handles key; commits
+    :return: None if this request now holds the key, else the existing row
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.expires_at < now).delete(synchronize_session=False)
+    statement = insert(IdempotencyKey.__table__).values(
+        user_id=user_id, key=key, fingerprint=fingerprint, created_at=now, expires_at=expires_at
+    ).on_conflict_do_nothing(index_elements=["user_id", "key"])
+    claimed = db.execute(statement).rowcount == 1
+    if not claimed:
+        # Take over a claim abandoned by a request that died before finishing
+        claimed = db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.fingerprint == fingerprint,
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.created_at < now - IN_FLIGHT_TIMEOUT
+        ).update({"created_at": now, "expires_at": expires_at}, synchronize_session=False) == 1
+    db.commit()
+    if claimed:
+        return None
+    return db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).first()
+
+
+def try_idempotency_key(user_id: int, key: str, fingerprint: str) -> Optional[tuple[str, Optional[int], Optional[dict]]]:
+    """
+    claim_idempotency_key in a session of its own (blocking; run it on the threadpool)
+    :return: None if this request now holds the key, else the (fingerprint, status_code, response) of the existing claim
+    """
+    with db_context() as db:
+        try:
+            existing = claim_idempotency_key(db, user_id, key, fingerprint)
+        except Exception as e:
+            db.rollback()
+            log_message(f"Failed to claim idempotency key: {str(e)}", error=True)
+            raise HTTPException(
+                status_code=500,
+                detail="An error occurred on our end."
+            )
+        if existing is None:
+            return None
+        return existing.fingerprint, existing.status_code, existing.response_json
+
+
+async def begin_idempotent_request(user_id: int, key: str, fingerprint: str) -> Optional[JSONResponse]:
+    """
+    Claim key for this request, or wait for the request that holds it. Database work runs on the threadpool, so
+    waiting doesn't hold up the event loop
+    :param user_id: id of the submitting user (keys are scoped per user)
+    :param key: value of the Idempotency-Key header
+    :param fingerprint: request_fingerprint of the request body
+    :return: None if the caller should handle the request (and later complete or release the key), else the stored response to replay
+    :raises HTTPException: if the key is malformed, was used for a different request, or is still in flight after IDEMPOTENCY_WAIT_SECONDS
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        existing = await run_in_threadpool(try_idempotency_key, user_id, key, fingerprint)
+        if existing is None:
+            return None
+        existing_fingerprint, status_code, response = existing
+        if existing_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="This Idempotency-Key was already used for a different request."
+            )
+        if status_code is not None:
+            log_message(f"Replaying stored response for idempotency key {key}")
+            return JSONResponse(
+                status_code=status_code,
+                content=response,
+                headers={"Idempotent-Replayed": "true"}
+            )
+        if loop.time() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress."
+            )
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+def complete_idempotency_key(db: Session, user_id: int, key: str, status_code: int, response: dict) -> None:
+    """Store the result of the request holding key. The caller is responsible for committing, together with the result itself"""
+    db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).update(
+        {"status_code": status_code, "response_json": response}, synchronize_session=False
+    )
+
+
+def release_idempotency_key(user_id: int, key: str) -> None:
+    """Drop an unfinished claim after the request failed, so that a retry with the same key runs again"""
+    with db_context() as db:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+        ).delete(synchronize_session=False)
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log_message(f"Failed to release idempotency key: {str(e)}", error=True)
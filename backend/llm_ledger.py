@@ -0,0 +1,138 @@
+"""Append-only ledger of LLM calls, plus a small report command.
+
+Usage (from the repository root):
+    python -m backend.llm_ledger --hours 24
+"""
+import argparse
+import json
+import math
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from backend import log_message, db_context
+from backend.models import LlmCall
+
+
+def record_llm_calls(
+        db: Session,
+        call_log: list[dict],
+        submission_id: str,
+        user_id: Optional[int] = None,
+        parsed_response_id: Optional[int] = None
+) -> None:
+    """
+    Add LlmCall rows for the attempts collected by open_ai_llm_call. The caller is responsible for committing
+    :param db: database session
+    :param call_log: list of attempt dicts, as populated by open_ai_llm_call
+    :param submission_id: identifier shared by every call made for one submission
+    :param user_id: id of the submitting user
+    :param parsed_response_id: id of the ParsedResponse the calls produced, if any
+    """
+    db.bulk_insert_mappings(LlmCall, [
+        {
+            "submission_id": submission_id,
+            "user_id": user_id,
+            "parsed_response_id": parsed_response_id,
+            "model": call["model"],
+            "tier": call.get("tier"),
+            "escalation_reason": call.get("escalation_reason"),
+            "attempt": call["attempt"],
+            "prompt_tokens": call.get("prompt_tokens"),
+            "completion_tokens": call.get("completion_tokens"),
+            "latency_ms": call.get("latency_ms", 0),
+            "valid": call.get("valid"),
+            "error": call["error"][:500] if call.get("error") else None,
+            "created_at": datetime.now(timezone.utc),
+        }
+        for call in call_log
+    ])
+
+
+def save_llm_calls(call_log: list[dict], submission_id: str, user_id: Optional[int] = None) -> None:
+    """Record calls in their own session; used when the submission failed before a ParsedResponse existed."""
+    if not call_log:
+        return
+    with db_context() as db:
+        record_llm_calls(db, call_log, submission_id, user_id=user_id)
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log_message(f"Failed to record LLM calls: {str(e)}", error=True)
+
+
+def percentile(values: list, fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of values; None if values is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize_llm_calls(db: Session, since: datetime, until: Optional[datetime] = None) -> dict:
+    """
+    Summarize the ledger over a time window
+    :param db: database session
+    :param since: start of the window
+    :param until: end of the window (defaults to now)
+    :return: dict with call-level latency percentiles and submission-level token/attempt statistics. A submission
+        failed if none of its extraction calls was valid (prefilter embedding calls are not counted)
+    """
+    until = until or datetime.now(timezone.utc)
+    rows = db.query(
+        LlmCall.submission_id, LlmCall.model, LlmCall.tier, LlmCall.escalation_reason, LlmCall.attempt,
+        LlmCall.latency_ms, LlmCall.prompt_tokens, LlmCall.completion_tokens, LlmCall.valid
+    ).filter(LlmCall.created_at >= since, LlmCall.created_at < until).all()
+
+    submissions = {}
+    models = {}
+    tier_latencies = {}
+    escalations = {}
+    for row in rows:
+        submission = submissions.setdefault(row.submission_id, {"latency_ms": 0, "tokens": 0, "attempts": 0, "extractions": 0, "valid": False})
+        submission["latency_ms"] += row.latency_ms
+        submission["tokens"] += (row.prompt_tokens or 0) + (row.completion_tokens or 0)
+        submission["attempts"] = max(submission["attempts"], row.attempt)
+        if row.tier != "prefilter":  # Prefilter embeddings say nothing about whether extraction succeeded
+            submission["extractions"] += 1
+            submission["valid"] = submission["valid"] or bool(row.valid)
+        models[row.model] = models.get(row.model, 0) + 1
+        if row.tier is not None:
+            tier_latencies.setdefault(row.tier, []).append(row.latency_ms)
+        if row.escalation_reason is not None:
+            escalations.setdefault(row.escalation_reason, set()).add(row.submission_id)
+
+    latencies = [row.latency_ms for row in rows]
+    submission_latencies = [s["latency_ms"] for s in submissions.values()]
+    submission_tokens = [s["tokens"] for s in submissions.values()]
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "calls": len(rows),
+        "calls_by_model": models,
+        "call_latency_ms": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95)},
+        "tier_latency_ms": {
+            tier: {"calls": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+            for tier, values in tier_latencies.items()
+        },
+        "escalations": {reason: len(submission_ids) for reason, submission_ids in escalations.items()},
+        "submissions": len(submissions),
+        "submissions_retried": sum(1 for s in submissions.values() if s["attempts"] > 1),
+        "submissions_failed": sum(1 for s in submissions.values() if s["extractions"] and not s["valid"]),
+        "submission_latency_ms": {"p50": percentile(submission_latencies, 0.5), "p95": percentile(submission_latencies, 0.95)},
+        "submission_tokens": {"p50": percentile(submission_tokens, 0.5), "p95": percentile(submission_tokens, 0.95)},
+        "total_prompt_tokens": sum(row.prompt_tokens or 0 for row in rows),
+        "total_completion_tokens": sum(row.completion_tokens or 0 for row in rows),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize LLM call latency and token usage")
+    parser.add_argument("--hours", type=float, default=24, help="Size of the time window, ending now")
+    args = parser.parse_args()
+
+    with db_context() as db:
+        summary = summarize_llm_calls(db, since=datetime.now(timezone.utc) - timedelta(hours=args.hours))
+    print(json.dumps(summary, indent=2))
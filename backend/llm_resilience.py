@@ -0,0 +1,212 @@
+"""Deadlines, hedged requests and circuit breaking for OpenAI calls.
+
+open_ai_llm_call sends every request through resilient_completion, which
+- bounds it by a deadline shared by every attempt made for one extraction, so a degraded provider produces an
+  error before gunicorn's worker timeout instead of a killed worker,
+- sends a duplicate ("hedged") request once the first is slower than the LLM_HEDGE_PERCENTILE latency of recent
+  calls to the same model, and uses whichever answers first, and
+- keeps a circuit breaker per model that, while too many recent calls fail, routes calls to LLM_FALLBACK_MODEL or
+  fails them immediately, until a probe call succeeds.
+State is kept per process, so each worker learns latencies and trips its breakers on its own.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional
+
+from backend import log_message, get_open_ai_client, LLM_HEDGE_PERCENTILE, LLM_FALLBACK_MODEL
+from backend.llm_ledger import percentile
+
+LATENCY_WINDOW = 200  # Recent successful calls per model used for the hedging threshold
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 1.0
+HEDGE_MAX_FRACTION = 0.1  # Never hedge more than this fraction of recent calls, however slow the provider gets
+BREAKER_WINDOW_SECONDS = 60
+BREAKER_MIN_CALLS = 10
+BREAKER_ERROR_RATE = 0.5
+BREAKER_COOLDOWN_SECONDS = 30
+
+# Hedged requests need a thread each while they wait on the network
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+
+class LlmDeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def is_provider_failure(e: Exception) -> bool:
+    """Errors that say something about the provider's health (timeouts, connection errors, 429s and 5xx), not about our request"""
+    status_code = getattr(e, "status_code", None)
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class LatencyTracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}  # Model -> deque of recent latencies in seconds
+        self.hedged = deque(maxlen=LATENCY_WINDOW)  # Whether each recent call was hedged
+
+    def record(self, model: str, seconds: float, hedged: bool) -> None:
+        with self.lock:
+            self.latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+            self.hedged.append(hedged)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging a call to model, or None to not hedge it"""
+        if LLM_HEDGE_PERCENTILE <= 0:
+            return None
+        with self.lock:
+            latencies = list(self.latencies.get(model, ()))
+            hedged_fraction = sum(self.hedged) / len(self.hedged) if self.hedged else 0.0
+        if len(latencies) < HEDGE_MIN_SAMPLES or hedged_fraction >= HEDGE_MAX_FRACTION:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, percentile(latencies, LLM_HEDGE_PERCENTILE))
+
+
+class CircuitBreaker:
+    def __init__(self, model: str):
+        self.model = model
+        self.lock = threading.Lock()
+        self.outcomes = deque()  # (time, failed) of calls in the last BREAKER_WINDOW_SECONDS
+        self.opened_at = None
+        self.probing = False
+
+    def acquire(self) -> Optional[str]:
+        """
+        Ask to make a call
+        :return: "closed" for a normal call, "probe" for the single trial call let through after the cooldown, or None if the breaker is open
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.probing or time.monotonic() - self.opened_at < BREAKER_COOLDOWN_SECONDS:
+                return None
+            self.probing = True
+            return "probe"
+
+    def record(self, state: str, failed: bool) -> None:
+        """Report the outcome of a call made after acquire() returned state"""
+        with self.lock:
+            now = time.monotonic()
+            if state == "probe":
+                self.probing = False
+                if failed:
+                    self.opened_at = now
+                    log_message(f"Circuit breaker for {self.model} stays open after a failed probe", error=True)
+                else:
+                    self.opened_at = None
+                    self.outcomes.clear()
+                    log_message(f"Circuit breaker for {self.model} closed")
+                return
+            if self.opened_at is not None:
+                return  # A call that started before the breaker opened
+            self.outcomes.append((now, failed))
+            while self.outcomes and self.outcomes[0][0] < now - BREAKER_WINDOW_SECONDS:
+                self.outcomes.popleft()
+            failures = sum(1 for _, outcome in self.outcomes if outcome)
+            if len(self.outcomes) >= BREAKER_MIN_CALLS and failures / len(self.outcomes) >= BREAKER_ERROR_RATE:
+                self.opened_at = now
+                log_message(f"Circuit breaker for {self.model} opened: {failures} of the last {len(self.outcomes)} calls failed", error=True)
+
+
+latency_tracker = LatencyTracker()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+def route(model: str) -> tuple[str, CircuitBreaker, str]:
+    """
+    Pick the model to call, given the state of the breakers
+    :return: (model, its breaker, breaker state from acquire())
+    :raises CircuitOpenError: if the breakers of model and of the fallback model are both open
+    """
+    breaker = get_breaker(model)
+    state = breaker.acquire()
+    if state is not None:
+        return model, breaker, state
+    if LLM_FALLBACK_MODEL and LLM_FALLBACK_MODEL != model:
+        fallback_breaker = get_breaker(LLM_FALLBACK_MODEL)
+        fallback_state = fallback_breaker.acquire()
+        if fallback_state is not None:
+            log_message(f"Circuit breaker for {model} is open; using {LLM_FALLBACK_MODEL}")
+            return LLM_FALLBACK_MODEL, fallback_breaker, fallback_state
+    raise CircuitOpenError(f"Circuit breaker for {model} is open")
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def first_result(futures: list, deadline: Optional[float]):
+    """Result of whichever future succeeds first; the last error if they all fail"""
+    pending = set(futures)
+    error = None
+    while pending:
+        timeout = remaining_seconds(deadline)
+        done, pending = wait(pending, timeout=None if timeout is None else max(0.0, timeout), return_when=FIRST_COMPLETED)
+        if not done:
+            raise LlmDeadlineExceeded("Deadline exceeded waiting for OpenAI")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def resilient_completion(model: str, messages: list[dict], response_format: Optional[dict] = None, deadline: Optional[float] = None) -> tuple:
+    """
+    Create a chat completion, hedged and bounded by deadline
+    :param model: requested model
+    :param messages: conversation to send
+    :param response_format: passed through to OpenAI if specified
+    :param deadline: time.monotonic() value by which the call must have returned
+    :return: (response, model actually used, whether a hedged request was sent)
+    :raises LlmDeadlineExceeded: if deadline passes first
+    :raises CircuitOpenError: if the model (and the fallback model) are failing
+    """
+    if deadline is not None and remaining_seconds(deadline) <= 0:
+        raise LlmDeadlineExceeded("Deadline exceeded before calling OpenAI")
+    model, breaker, state = route(model)
+
+    def send():
+        timeout = remaining_seconds(deadline)
+        if timeout is not None and timeout <= 0:
+            raise LlmDeadlineExceeded("Deadline exceeded before calling OpenAI")
+        # The deadline covers retries, so the client's own retries are disabled
+        client = get_open_ai_client().with_options(max_retries=0, **({"timeout": timeout} if timeout is not None else {}))
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            **({"response_format": response_format} if response_format is not None else {})
+        )
+
+    start = time.monotonic()
+    futures = [_executor.submit(send)]
+    hedged = False
+    try:
+        hedge_delay = latency_tracker.hedge_delay(model) if state == "closed" else None
+        if hedge_delay is not None:
+            timeout = remaining_seconds(deadline)
+            done, _ = wait(futures, timeout=hedge_delay if timeout is None else max(0.0, min(hedge_delay, timeout)))
+            if not done and (timeout is None or timeout > hedge_delay):
+                futures.append(_executor.submit(send))
+                hedged = True
+        response = first_result(futures, deadline)
+    except Exception as e:
+        breaker.record(state, failed=isinstance(e, LlmDeadlineExceeded) or is_provider_failure(e))
+        raise
+    breaker.record(state, failed=False)
+    latency_tracker.record(model, time.monotonic() - start, hedged)
+    return response, model, hedged
@@ -1,7 +1,8 @@
 from datetime import datetime, timezone
 import json
-from sqlalchemy import Column, Integer, String, Boolean, JSON, TIMESTAMP, ForeignKey
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Boolean, JSON, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR, ARRAY, JSONB
+from sqlalchemy.orm import Mapped, relationship, deferred
 from typing import List
 from pgvector.sqlalchemy import Vector
 
@@ -24,7 +25,7 @@ class User(Base):
     user_json = Column(JSON, nullable=True) # Keep this for additional LinkedIn profile data and anything else
 
     # Define relationships
-    parsed_responses: Mapped[List["ParsedResponse"]] = relationship("ParsedResponse", back_populates="user", cascade="all, delete-orphan")
+    parsed_responses: Mapped[List["ParsedResponse"]] = relationship("ParsedResponse", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
     def user_data(self):
         return json.loads(self.user_json) if self.user_json else {}
@@ -35,51 +36,119 @@ class ParseField(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(200), nullable=False, unique=True, index=True)
 
-    # Define relationships
-    parse_field_values: Mapped[List["ParseFieldValue"]] = relationship("ParseFieldValue", back_populates="parse_field", cascade="all, delete-orphan")
-
 class ParsedResponse(Base):
     __tablename__ = 'parsed_response'
+    __table_args__ = (
+        Index('ix_parsed_response_search_vector', 'search_vector', postgresql_using='gin'),
+        # Each ParseField also has a partial browse index, not declared here (see backend.fields.create_field_indexes)
+    )
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     name = Column(String(200), nullable=True)
     raw_text = Column(String(20000), nullable=False)
     anonymize = Column(Boolean, nullable=False, default=False)
     parsed_response_json = Column(JSON, nullable=True)  # For additional details
+    # Extracted values keyed by str(ParseField.id); null for fields that were extracted but not found in the text
+    field_values = Column(JSONB, nullable=True)
+    # Full-text index over name, raw_text and field values; maintained on write by backend.search.refresh_search_vectors
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc),
                         onupdate=lambda: datetime.now(timezone.utc), nullable=False)
 
     # Define relationships
     user: Mapped["User"] = relationship("User", back_populates="parsed_responses")
-    parse_field_values: Mapped[List["ParseFieldValue"]] = relationship("ParseFieldValue", back_populates="parsed_response", cascade="all, delete-orphan")
 
     def parsed_response_data(self):
         return json.loads(self.parsed_response_json) if self.parsed_response_json else {}
 
 class ParseFieldValue(Base):
+    """
+    Read-only view with one row per stored field value, for per-field queries. Values are stored in
+    ParsedResponse.field_values and written there (see backend.fields)
+    """
     __tablename__ = 'parse_field_value'
+    __table_args__ = {'info': {'is_view': True}}  # Created by a migration; skipped by Alembic autogenerate
 
-    id = Column(Integer, primary_key=True)
-    parse_field_id = Column(Integer, ForeignKey('parse_field.id'), nullable=False)
-    parsed_response_id = Column(Integer, ForeignKey('parsed_response.id'), nullable=False)
-    value = Column(String(5000), nullable=True)  # Can be null
+    parsed_response_id = Column(Integer, primary_key=True)
+    parse_field_id = Column(Integer, primary_key=True)
+    value = Column(String(5000), nullable=True)
 
-    # Define relationships
-    parse_field: Mapped["ParseField"] = relationship("ParseField", back_populates="parse_field_values")
-    parsed_response: Mapped["ParsedResponse"] = relationship("ParsedResponse", back_populates="parse_field_values")
+class FieldStats(Base):
+    """Per-field coverage counts, maintained incrementally by backend.fields.update_coverage"""
+    __tablename__ = 'field_stats'
+
+    parse_field_id = Column(Integer, ForeignKey('parse_field.id', ondelete='CASCADE'), primary_key=True)
+    value_count = Column(Integer, nullable=False, default=0)  # Experiences with a row for this field
+    filled_count = Column(Integer, nullable=False, default=0)  # ...of which have a non-null value
+
+class UserStats(Base):
+    """Per-user counts, maintained incrementally by backend.fields.update_coverage"""
+    __tablename__ = 'user_stats'
+
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    experience_count = Column(Integer, nullable=False, default=0)
+    filled_value_count = Column(Integer, nullable=False, default=0)
+
+class TextSignature(Base):
+    """MinHash signature of a ParsedResponse's raw_text, used for near-duplicate detection (see backend.dedup)"""
+    __tablename__ = 'text_signature'
+
+    parsed_response_id = Column(Integer, ForeignKey('parsed_response.id', ondelete='CASCADE'), primary_key=True)
+    minhash = Column(ARRAY(BigInteger), nullable=False)
+
+class LshBucket(Base):
+    """One row per LSH band of a TextSignature; responses sharing a (band, bucket) are duplicate candidates"""
+    __tablename__ = 'lsh_bucket'
+
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    parsed_response_id = Column(Integer, ForeignKey('parsed_response.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+class IdempotencyKey(Base):
+    """Idempotency-Key of a submission; status_code is null while the request holding it is in flight (see backend.idempotency)"""
+    __tablename__ = 'idempotency_key'
+
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request body, to reject reuse for a different request
+    status_code = Column(Integer, nullable=True)
+    response_json = Column(JSON, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
 
 class Embedding(Base):
     __tablename__ = 'embedding'
 
     id = Column(Integer, primary_key=True)
 
-    # Only one of these should be non-null
-    parsed_response_id = Column(Integer, ForeignKey('parsed_response.id'), nullable=True)
-    parsed_field_value_id = Column(Integer, ForeignKey('parse_field_value.id'), nullable=True)
+    # Embedding of a response, or of one of its field values if parse_field_id is set
+    parsed_response_id = Column(Integer, ForeignKey('parsed_response.id', ondelete='CASCADE'), nullable=True)
+    parse_field_id = Column(Integer, ForeignKey('parse_field.id', ondelete='CASCADE'), nullable=True)
 
     embedding = Column(Vector(1536), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc),
                         onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+class LlmCall(Base):
+    __tablename__ = 'llm_call'
+
+    id = Column(Integer, primary_key=True)
+
+    # Groups every attempt made on behalf of one submission, including ones that never produced a ParsedResponse
+    submission_id = Column(String(36), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    parsed_response_id = Column(Integer, ForeignKey('parsed_response.id', ondelete='SET NULL'), nullable=True, index=True)
+
+    model = Column(String(100), nullable=False)
+    tier = Column(String(20), nullable=True)  # Extraction tier ("fast" or "strong") if tiered routing was used, or "prefilter" for relevance prefilter embeddings
+    escalation_reason = Column(String(50), nullable=True)  # Why a fast-tier result was rejected, if it was
+    attempt = Column(Integer, nullable=False)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, nullable=False)
+    valid = Column(Boolean, nullable=True)  # Null when no validation function was used
+    error = Column(String(500), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
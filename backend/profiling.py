@@ -0,0 +1,306 @@
+"""Opt-in per-request sampling profiler.
+
+With PROFILING_ENABLED=1, create_app adds a middleware that profiles
+- requests from an admin (see ADMIN_USER_IDS) that carry the header "X-Profile: 1", and
+- a random PROFILE_SAMPLE_RATE fraction of all requests.
+A profiled request gets an X-Profile-Id response header naming its file, which admins can download from
+/api/admin/profiles/{profile_id}. Files are speedscope JSON (open them at https://www.speedscope.app) holding
+- one sampled profile per thread that worked on the request: the event loop thread (middleware, async endpoint
+  code, serialization) and any thread while it is inside a db_context session or an open_ai_llm_call, and
+- one evented profile per thread with the exact start and end of every such span.
+Event loop samples also include other requests that were interleaved with the profiled one, and a streaming
+response is profiled only until its headers are sent. The newest PROFILE_MAX_FILES files per directory are kept.
+
+When PROFILING_ENABLED is off the middleware isn't added, and profile_span() costs one context variable lookup.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import FileResponse
+from jose import jwt
+from jose.exceptions import JWTError
+from starlette.concurrency import run_in_threadpool
+
+from backend import (
+    log_message, db_context, ADMIN_USER_IDS, JWT_SECRET_KEY, JWT_ALGORITHM,
+    PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_INTERVAL_MS
+)
+from backend.auth import get_admin_user
+
+router = APIRouter()
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+MAX_STACK_DEPTH = 128
+
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.ended = None
+        self.threads = {}  # Thread id -> number of open spans (or the request itself) on it
+        self.samples = []  # (time, thread id, stack of (function, file, line) from the root)
+        self.events = []  # (time, "O" or "C", span name, thread id)
+
+    def enter(self, name: Optional[str], thread_id: int) -> None:
+        with self.lock:
+            self.threads[thread_id] = self.threads.get(thread_id, 0) + 1
+            if name is not None:
+                self.events.append((time.perf_counter(), "O", name, thread_id))
+
+    def exit(self, name: Optional[str], thread_id: int) -> None:
+        with self.lock:
+            if name is not None:
+                self.events.append((time.perf_counter(), "C", name, thread_id))
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] == 0:
+                del self.threads[thread_id]
+
+    def span_totals(self) -> dict[str, float]:
+        """Milliseconds spent in each kind of span (summed over threads)"""
+        totals = {}
+        open_spans = {}
+        for at, kind, name, thread_id in self.events:
+            if kind == "O":
+                open_spans.setdefault((name, thread_id), []).append(at)
+            elif open_spans.get((name, thread_id)):
+                totals[name] = totals.get(name, 0.0) + (at - open_spans[(name, thread_id)].pop()) * 1000
+        return totals
+
+    def to_speedscope(self) -> dict:
+        frames = []
+        frame_index = {}
+
+        def index(frame: tuple) -> int:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                function, file, line = frame
+                frames.append({"name": function, "file": file, "line": line})
+            return frame_index[frame]
+
+        end = (self.ended - self.started) * 1000
+        profiles = []
+        samples_by_thread = {}
+        for at, thread_id, stack in self.samples:
+            if at > self.ended:
+                break  # Taken while the sampler was finishing its last round
+            samples_by_thread.setdefault(thread_id, []).append((at, stack))
+        for thread_id, thread_samples in samples_by_thread.items():
+            previous = self.started
+            stacks, weights = [], []
+            for at, stack in thread_samples:
+                stacks.append([index(frame) for frame in stack])
+                weights.append(round((at - previous) * 1000, 3))
+                previous = at
+            profiles.append({
+                "type": "sampled", "name": f"Thread {thread_id}", "unit": "milliseconds",
+                "startValue": 0, "endValue": round(end, 3), "samples": stacks, "weights": weights,
+            })
+        # Spans as one evented profile per thread (speedscope needs each profile's events to nest); a span still
+        # open when the request ended is closed at the end
+        events_by_thread = {}
+        for at, kind, name, thread_id in self.events:
+            events_by_thread.setdefault(thread_id, []).append({
+                "type": kind, "frame": index((name, "", 0)), "at": round(min(at - self.started, end / 1000) * 1000, 3)
+            })
+        for thread_id, events in events_by_thread.items():
+            open_frames = []
+            for event in events:
+                if event["type"] == "O":
+                    open_frames.append(event["frame"])
+                else:
+                    open_frames.pop()
+            events.extend({"type": "C", "frame": frame, "at": round(end, 3)} for frame in reversed(open_frames))
+            profiles.append({
+                "type": "evented", "name": f"Spans on thread {thread_id}", "unit": "milliseconds",
+                "startValue": 0, "endValue": round(end, 3), "events": events,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "backend.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+class Sampler:
+    """One thread per process that samples the stacks of every thread registered with an active profile"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = set()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self.lock:
+            self.active.add(profile)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self.lock:
+            self.active.discard(profile)
+
+    def run(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            with self.lock:
+                profiles = list(self.active)
+                if not profiles:
+                    self.wake.clear()
+            if not profiles:
+                self.wake.wait()
+                continue
+            now = time.perf_counter()
+            current_frames = sys._current_frames()
+            for profile in profiles:
+                with profile.lock:
+                    thread_ids = list(profile.threads)
+                for thread_id in thread_ids:
+                    frame = current_frames.get(thread_id)
+                    if frame is not None:
+                        profile.samples.append((now, thread_id, stack_of(frame)))
+            del current_frames
+            time.sleep(interval)
+
+
+def stack_of(frame) -> list[tuple]:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+sampler = Sampler()
+
+
+@contextmanager
+def profile_span(name: str):
+    """Record time spent in the block (and sample this thread meanwhile) if the current request is being profiled"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    profile.enter(name, thread_id)
+    try:
+        yield
+    finally:
+        profile.exit(name, thread_id)
+
+
+def is_admin_request(request: Request) -> bool:
+    """Whether the bearer token belongs to an admin. Only the token is checked, so no database session is needed"""
+    auth = request.headers.get("authorization", "")
+    if not auth.startswith("Bearer "):
+        return False
+    try:
+        payload = jwt.decode(auth.split(" ")[1], JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        return int(payload.get("sub")) in ADMIN_USER_IDS
+    except (JWTError, TypeError, ValueError):
+        return False
+
+
+def should_profile(request: Request) -> bool:
+    if request.headers.get(PROFILE_HEADER) == "1":
+        if is_admin_request(request):
+            return True
+        log_message(f"Ignoring {PROFILE_HEADER} header on a request from a non-admin")
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def save_profile(profile: RequestProfile) -> str:
+    """Write profile to PROFILE_DIR, then delete the oldest files beyond PROFILE_MAX_FILES. Returns the profile id"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    # Names sort by time, across workers
+    profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile.to_speedscope(), f)
+    os.replace(tmp_path, path)
+
+    saved = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".speedscope.json"))
+    for name in saved[:-PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass  # Another worker pruned it first
+    return profile_id
+
+
+def add_profiling_middleware(app) -> None:
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        if request.method == "OPTIONS" or not should_profile(request):
+            return await call_next(request)
+
+        profile = RequestProfile(f"{request.method} {request.url.path}")
+        token = current_profile.set(profile)  # Copied into the tasks and threadpool threads that handle the request
+        loop_thread_id = threading.get_ident()
+        profile.enter(None, loop_thread_id)
+        sampler.add(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            profile.ended = time.perf_counter()
+            sampler.remove(profile)
+            profile.exit(None, loop_thread_id)
+            current_profile.reset(token)
+
+        totals = profile.span_totals()
+        try:
+            profile_id = await run_in_threadpool(save_profile, profile)
+        except Exception as e:
+            log_message(f"Failed to save profile of {profile.name}: {str(e)}", error=True)
+            return response
+        response.headers[PROFILE_ID_HEADER] = profile_id
+        log_message(
+            f"Profiled {profile.name} ({response.status_code}) as {profile_id}: "
+            f"{(profile.ended - profile.started) * 1000:.0f} ms total, "
+            + ", ".join(f"{name} {ms:.0f} ms" for name, ms in sorted(totals.items()))
+            + f", {len(profile.samples)} samples"
+        )
+        return response
+
+
+@router.get("/api/admin/profiles")
+async def api_list_profiles(request: Request):
+    """Ids of the saved profiles, newest first"""
+    with db_context() as db:
+        await get_admin_user(request=request, db=db)
+    if not os.path.isdir(PROFILE_DIR):
+        return {"profiles": []}
+    names = sorted((name for name in os.listdir(PROFILE_DIR) if name.endswith(".speedscope.json")), reverse=True)
+    return {"profiles": [name[:-len(".speedscope.json")] for name in names]}
+
+
+@router.get("/api/admin/profiles/{profile_id}")
+async def api_get_profile(request: Request, profile_id: str):
+    with db_context() as db:
+        await get_admin_user(request=request, db=db)
+    path = os.path.join(PROFILE_DIR, f"{os.path.basename(profile_id)}.speedscope.json")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="No such profile")
+    return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
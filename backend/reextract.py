@@ -0,0 +1,240 @@
+"""Resumable re-extraction of fields that were added to or reworded in fields_for_extraction.txt.
+
+Only the fields a stored ParsedResponse is missing are sent to the LLM, so a field-list change costs a
+fraction of a full re-run. Progress is checkpointed after every batch. Usage (from the repository root):
+    python -m backend.reextract --concurrency 8 --batch-size 50
+    python -m backend.reextract --dry-run
+"""
+import argparse
+import hashlib
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.orm import Session
+
+from backend import log_message, db_context, fields_for_extraction
+from backend.llm_ledger import record_llm_calls
+from backend.models import ParseField, ParsedResponse
+from backend.search import refresh_search_vectors
+from backend.fields import update_coverage, field_values_for_storage, merge_field_values
+from backend.utils import extract_fields
+
+DEFAULT_CHECKPOINT_PATH = "reextract_checkpoint.json"
+# Failed responses still lack their fields, so the next run retries them anyway; the checkpoint only keeps the most
+# recent ids (for the log) and a count
+MAX_FAILED_IDS = 100
+
+
+def get_or_create_parse_fields(db: Session, fields: list[str]) -> dict[str, int]:
+    """
+    Make sure every field has a ParseField row
+    :param db: database session
+    :param fields: field names
+    :return: dict mapping field name to ParseField id
+    """
+    field_ids = {name: field_id for field_id, name in db.query(ParseField.id, ParseField.name).filter(ParseField.name.in_(fields))}
+    added = False
+    for field in fields:
+        if field not in field_ids:
+            log_message(f"Adding new ParseField to database: {field}")
+            parse_field = ParseField(name=field)
+            db.add(parse_field)
+            db.flush()
+            field_ids[field] = parse_field.id
+            added = True
+    db.commit()
+    if added:
+        log_message("New fields have no browse index yet; build them with: python -m backend.fields --create-indexes")
+    return field_ids
+
+
+def stale_field_ids(db: Session, fields: list[str]) -> list[int]:
+    """Ids of ParseFields that are no longer in the field list (e.g. the old wording of a reworded field)."""
+    return [field_id for (field_id,) in db.query(ParseField.id).filter(ParseField.name.notin_(fields))]
+
+
+def fields_hash(fields: list[str]) -> str:
+    return hashlib.sha256("\n".join(fields).encode()).hexdigest()
+
+
+def load_checkpoint(path: str, current_hash: str) -> dict:
+    """Load the checkpoint if it was written for the same field list, otherwise start over."""
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("fields_hash") == current_hash:
+            checkpoint.setdefault("failed_count", len(checkpoint.get("failed", [])))
+            checkpoint["failed"] = checkpoint.get("failed", [])[-MAX_FAILED_IDS:]
+            return checkpoint
+        log_message("Field list changed since the last checkpoint; starting over")
+    return {"fields_hash": current_hash, "last_id": 0, "updated": 0, "failed_count": 0, "failed": []}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def missing_fields_for_batch(db: Session, after_id: int, batch_size: int, field_ids: dict[str, int]) -> tuple[list, int]:
+    """
+    Find the next batch of responses and the fields each one lacks
+    :return: (list of (parsed_response_id, user_id, raw_text, missing field names), last id scanned or 0 when done)
+    """
+    rows = db.query(ParsedResponse.id, ParsedResponse.user_id, ParsedResponse.field_values).filter(ParsedResponse.id > after_id) \
+        .order_by(ParsedResponse.id).limit(batch_size).all()
+    if not rows:
+        return [], 0
+    present = {row.id: {int(key) for key in (row.field_values or {})} for row in rows}
+
+    work = []
+    needs_text = []
+    for row in rows:
+        missing = [field for field, field_id in field_ids.items() if field_id not in present.get(row.id, set())]
+        if missing:
+            work.append([row.id, row.user_id, None, missing])
+            needs_text.append(row.id)
+    # Only load raw_text for responses that actually need an LLM call
+    texts = dict(db.query(ParsedResponse.id, ParsedResponse.raw_text).filter(ParsedResponse.id.in_(needs_text))) if needs_text else {}
+    for item in work:
+        item[2] = texts[item[0]]
+    return [tuple(item) for item in work], rows[-1].id
+
+
+def reextract(
+        batch_size: int = 50,
+        concurrency: int = 4,
+        checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+        drop_stale: bool = False,
+        dry_run: bool = False,
+        limit: Optional[int] = None
+) -> dict:
+    """
+    Extract the missing fields of every stored ParsedResponse
+    :param batch_size: number of responses scanned (and upserted) per batch
+    :param concurrency: maximum number of concurrent LLM calls
+    :param checkpoint_path: file used to resume an interrupted run
+    :param drop_stale: if True, delete values of fields that are no longer in fields_for_extraction
+    :param dry_run: if True, only report how much work there is
+    :param limit: stop after this many responses have been sent to the LLM. The run only counts as finished (clearing
+        the checkpoint and allowing drop_stale) once no response is left to scan
+    :return: the final checkpoint dict
+    """
+    current_hash = fields_hash(fields_for_extraction)
+    checkpoint = load_checkpoint(checkpoint_path, current_hash)
+    with db_context() as db:
+        field_ids = get_or_create_parse_fields(db, fields_for_extraction) if not dry_run else \
+            {name: field_id for field_id, name in db.query(ParseField.id, ParseField.name).filter(ParseField.name.in_(fields_for_extraction))}
+    if dry_run:
+        # Fields without a ParseField row yet are missing everywhere; give them ids that never match
+        field_ids.update({field: -(i + 1) for i, field in enumerate(fields_for_extraction) if field not in field_ids})
+
+    def run_one(item):
+        parsed_response_id, user_id, raw_text, missing = item
+        call_log = []
+        try:
+            pairs = extract_fields(raw_text, fields=missing, call_log=call_log)
+        except Exception as e:
+            log_message(f"Re-extraction failed for ParsedResponse {parsed_response_id}: {str(e)}", error=True)
+            pairs = None
+        return item, pairs, call_log
+
+    sent = 0
+    pending_calls = 0
+    finished = False
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            with db_context() as db:
+                work, last_id = missing_fields_for_batch(db, checkpoint["last_id"], batch_size, field_ids)
+            if last_id == 0:
+                finished = True
+                break
+            if limit is not None and sent >= limit and work:
+                break
+            if limit is not None and len(work) > limit - sent:
+                work = work[:limit - sent]
+                last_id = work[-1][0]  # Resume right after the last response we actually processed
+            sent += len(work)
+
+            if dry_run:
+                pending_calls += len(work)
+                checkpoint["last_id"] = last_id
+                continue
+
+            results = list(executor.map(run_one, work))
+            with db_context() as db:
+                values_by_response = {}
+                for (parsed_response_id, user_id, _, _), pairs, call_log in results:
+                    record_llm_calls(db, call_log, str(uuid.uuid4()), user_id=user_id, parsed_response_id=parsed_response_id)
+                    if pairs is None:
+                        checkpoint["failed_count"] += 1
+                        checkpoint["failed"] = (checkpoint["failed"] + [parsed_response_id])[-MAX_FAILED_IDS:]
+                        continue
+                    values_by_response[parsed_response_id] = field_values_for_storage(field_ids, pairs)
+                    checkpoint["updated"] += 1
+                updated_ids = sorted(values_by_response)
+                update_coverage(db, updated_ids, sign=-1)
+                merge_field_values(db, values_by_response)
+                refresh_search_vectors(db, updated_ids)
+                update_coverage(db, updated_ids, sign=1)
+                try:
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    log_message(f"Failed to write re-extracted values: {str(e)}", error=True)
+                    raise
+            checkpoint["last_id"] = last_id
+            save_checkpoint(checkpoint_path, checkpoint)
+            log_message(f"Re-extraction progress: last_id={last_id}, updated={checkpoint['updated']}, failed={checkpoint['failed_count']}")
+
+    if dry_run:
+        log_message(f"Dry run: {pending_calls} responses need re-extraction")
+        checkpoint["pending"] = pending_calls
+        return checkpoint
+
+    if finished and os.path.exists(checkpoint_path):
+        # A complete pass leaves nothing to resume; failures are picked up again by the next run's diff
+        os.remove(checkpoint_path)
+
+    if drop_stale and finished:
+        with db_context() as db:
+            stale_ids = stale_field_ids(db, fields_for_extraction)
+            if stale_ids:
+                stale_keys = [str(field_id) for field_id in stale_ids]
+                affected_ids = [response_id for (response_id,) in db.query(ParsedResponse.id)
+                                .filter(ParsedResponse.field_values.has_any(array(stale_keys)))]
+                update_coverage(db, affected_ids, sign=-1)
+                db.query(ParsedResponse).filter(ParsedResponse.id.in_(affected_ids)).update(
+                    {ParsedResponse.field_values: ParsedResponse.field_values.op("-")(array(stale_keys))}, synchronize_session=False
+                )
+                refresh_search_vectors(db, affected_ids)
+                update_coverage(db, affected_ids, sign=1)
+                db.commit()
+                log_message(f"Deleted values of fields no longer in fields_for_extraction from {len(affected_ids)} experiences")
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract newly added or reworded fields for existing experiences")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent LLM calls")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Checkpoint file for resuming")
+    parser.add_argument("--drop-stale", action="store_true", help="Delete values of fields no longer in the field list")
+    parser.add_argument("--dry-run", action="store_true", help="Only count responses that need re-extraction")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many responses")
+    args = parser.parse_args()
+
+    result = reextract(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+        drop_stale=args.drop_stale,
+        dry_run=args.dry_run,
+        limit=args.limit
+    )
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,139 @@
+"""Embedding-based relevance prefilter for extraction.
+
+Most texts only address a few of the fields, but the extraction prompt lists (and the model answers) every one of
+them. With RELEVANCE_PREFILTER=1, extract_fields first calls prefilter_fields, which
+- splits the text into chunks of about RELEVANCE_CHUNK_CHARS at sentence and paragraph boundaries,
+- embeds the chunks with one embeddings call, and compares them with embeddings of the field descriptions (computed
+  once per process), and
+- drops every field whose most similar chunk is below RELEVANCE_THRESHOLD; dropped fields come back as None.
+The LLM is then asked for the remaining fields only, from the chunks relevant to at least one of them. If the
+prefilter fails for any reason, every field is extracted from the whole text. Recall at a given threshold is
+measured by backend.benchmarks.relevance.
+"""
+import re
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from backend import log_message, get_open_ai_client, RELEVANCE_EMBEDDING_MODEL, RELEVANCE_THRESHOLD, RELEVANCE_CHUNK_CHARS
+from backend.llm_resilience import LlmDeadlineExceeded
+
+_field_embeddings = {}  # (model, field) -> unit-length embedding of the field's description
+_field_embeddings_lock = threading.Lock()
+
+
+def chunk_text(text: str, chunk_chars: int = RELEVANCE_CHUNK_CHARS) -> list[str]:
+    """Split text into chunks of about chunk_chars, at sentence and paragraph boundaries"""
+    sentences = [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+|\n\s*\n", text) if sentence.strip()]
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) + 1 > chunk_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def embed(texts: list[str], call_log: Optional[list] = None, deadline: Optional[float] = None) -> np.ndarray:
+    """
+    Embed texts with RELEVANCE_EMBEDDING_MODEL in one request
+    :param call_log: if specified, a record of the call (model, tokens, latency) is appended to it, as in open_ai_llm_call
+    :param deadline: time.monotonic() value by which the call must have returned
+    :return: array with one unit-length row per text
+    """
+    timeout = None if deadline is None else deadline - time.monotonic()
+    if timeout is not None and timeout <= 0:
+        raise LlmDeadlineExceeded("Deadline exceeded before calling OpenAI")
+    call_record = {"model": RELEVANCE_EMBEDDING_MODEL, "attempt": 1, "valid": None, "error": None, "tier": "prefilter"}
+    if call_log is not None:
+        call_log.append(call_record)
+    start_time = time.perf_counter()
+    try:
+        client = get_open_ai_client().with_options(max_retries=0, **({"timeout": timeout} if timeout is not None else {}))
+        response = client.embeddings.create(model=RELEVANCE_EMBEDDING_MODEL, input=texts)
+    except Exception as e:
+        call_record["error"] = str(e)
+        raise
+    finally:
+        call_record["latency_ms"] = int((time.perf_counter() - start_time) * 1000)
+    call_record["valid"] = True
+    if response.usage is not None:
+        call_record["prompt_tokens"] = response.usage.prompt_tokens
+        call_record["completion_tokens"] = 0
+    vectors = np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def field_embeddings(fields: list[str], call_log: Optional[list] = None, deadline: Optional[float] = None) -> np.ndarray:
+    """Embeddings of the field descriptions, one row per field; only fields not seen before are embedded"""
+    with _field_embeddings_lock:
+        missing = [field for field in fields if (RELEVANCE_EMBEDDING_MODEL, field) not in _field_embeddings]
+    if missing:
+        for field, vector in zip(missing, embed(missing, call_log=call_log, deadline=deadline)):
+            with _field_embeddings_lock:
+                _field_embeddings[(RELEVANCE_EMBEDDING_MODEL, field)] = vector
+    with _field_embeddings_lock:
+        return np.stack([_field_embeddings[(RELEVANCE_EMBEDDING_MODEL, field)] for field in fields])
+
+
+def field_similarities(text: str, fields: list[str], call_log: Optional[list] = None, deadline: Optional[float] = None) -> tuple[list[str], np.ndarray]:
+    """
+    Cosine similarity of every chunk of text to every field description
+    :return: (chunks, array of shape (number of chunks, number of fields))
+    """
+    chunks = chunk_text(text)
+    if not chunks:
+        return chunks, np.zeros((0, len(fields)), dtype=np.float32)
+    return chunks, embed(chunks, call_log=call_log, deadline=deadline) @ field_embeddings(fields, call_log=call_log, deadline=deadline).T
+
+
+def select_relevant(text: str, fields: list[str], chunks: list[str], similarities: np.ndarray, threshold: float) -> tuple[list[str], str]:
+    """
+    Apply threshold to the output of field_similarities
+    :return: (fields with at least one relevant chunk, in their original order, and the text to extract them from)
+    """
+    relevant = similarities >= threshold
+    kept_fields = [field for j, field in enumerate(fields) if relevant[:, j].any()]
+    passages = [chunk for i, chunk in enumerate(chunks) if relevant[i].any()]
+    if len(passages) == len(chunks):
+        return kept_fields, text
+    return kept_fields, "\n\n".join(passages)
+
+
+def prefilter_fields(
+        text: str,
+        fields: list[str],
+        call_log: Optional[list] = None,
+        deadline: Optional[float] = None,
+        threshold: Optional[float] = None
+) -> tuple[list[str], str]:
+    """
+    Drop the fields that text is unlikely to address
+    :param text: text from which fields will be extracted
+    :param fields: fields to extract
+    :param call_log: passed through to embed for LLM call accounting
+    :param deadline: time.monotonic() value by which the embeddings calls must have returned
+    :param threshold: minimum chunk/field cosine similarity (defaults to RELEVANCE_THRESHOLD)
+    :return: (fields to ask the LLM for, text to send with them); every field and the whole text if the prefilter fails
+    """
+    threshold = threshold if threshold is not None else RELEVANCE_THRESHOLD
+    try:
+        chunks, similarities = field_similarities(text, fields, call_log=call_log, deadline=deadline)
+    except Exception as e:
+        log_message(f"Relevance prefilter failed, extracting every field: {str(e)}", error=True)
+        return fields, text
+    kept_fields, relevant_text = select_relevant(text, fields, chunks, similarities, threshold)
+    log_message(f"Relevance prefilter kept {len(kept_fields)} of {len(fields)} fields and {len(relevant_text)} of {len(text)} characters")
+    return kept_fields, relevant_text
+
+
+def with_dropped_fields(fields: list[str], field_response_pairs: list[tuple[str, Optional[str]]]) -> list[tuple[str, Optional[str]]]:
+    """(field, response) pairs for every one of fields, in order, with None for the fields the prefilter dropped"""
+    responses = dict(field_response_pairs)
+    return [(field, responses.get(field)) for field in fields]
@@ -0,0 +1,168 @@
+import base64
+import html
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Request, HTTPException
+from sqlalchemy import func, or_, and_, text, bindparam
+from sqlalchemy.orm import Session
+
+from backend import log_message, read_db_context
+from backend.auth import get_current_user
+from backend.models import ParseField, ParsedResponse, User
+
+router = APIRouter()
+
+SEARCH_CONFIG = "english"
+MAX_SEARCH_RESULTS = 50
+# Control characters mark highlighted terms so the snippet can be HTML-escaped before they become <mark> tags
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=25, MinWords=8, FragmentDelimiter=\" … \""
+
+# Kept in sync with the backfill in the migration that added search_vector
+refresh_search_vectors_sql = text(f"""
+    UPDATE parsed_response
+    SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(parsed_response.name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', parsed_response.raw_text), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(field_value.value, ' ')
+            FROM jsonb_each_text(parsed_response.field_values) AS field_value
+        ), '')), 'C')
+    WHERE parsed_response.id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+def refresh_search_vectors(db: Session, parsed_response_ids: list[int]) -> None:
+    """
+    Recompute ParsedResponse.search_vector from the name, raw_text and field values. Call after those change
+    (and after flushing them), before committing
+    :param db: database session
+    :param parsed_response_ids: ids of the responses to refresh
+    """
+    if parsed_response_ids:
+        db.execute(refresh_search_vectors_sql, {"ids": list(parsed_response_ids)})
+
+
+def encode_cursor(rank: float, parsed_response_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, parsed_response_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, parsed_response_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(parsed_response_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def render_snippet(headline: Optional[str]) -> Optional[str]:
+    """HTML-escape a ts_headline result and turn its highlight markers into <mark> tags."""
+    if headline is None:
+        return None
+    return html.escape(headline).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+def search_experiences(
+        db: Session,
+        q: str,
+        field_id: Optional[int] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+) -> tuple[list, Optional[str]]:
+    """
+    Ranked full-text search over experiences
+    :param db: database session
+    :param q: search query, in web search syntax ("quoted phrases", -exclusions, or)
+    :param field_id: if specified, only match (and snippet) the value of this ParseField
+    :param limit: page size
+    :param cursor: opaque cursor returned with the previous page
+    :return: (list of result rows, cursor for the next page or None)
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+    # Rank every match using only the GIN-indexed vector; the page is cut before anything else is loaded
+    if field_id is None:
+        vector = ParsedResponse.search_vector
+        matches = db.query(
+            ParsedResponse.id.label("id"),
+            func.ts_rank_cd(vector, ts_query).label("rank"),
+        ).filter(vector.op("@@")(ts_query))
+    else:
+        # The response's vector (which includes every field value) narrows the candidates through its index; the
+        # field's own vector is only computed for those. A full-text index per field would cost every write more
+        field_value = ParsedResponse.field_values[str(field_id)].astext
+        vector = func.to_tsvector(SEARCH_CONFIG, func.coalesce(field_value, ""))
+        matches = db.query(
+            ParsedResponse.id.label("id"),
+            func.ts_rank_cd(vector, ts_query).label("rank"),
+        ).filter(ParsedResponse.search_vector.op("@@")(ts_query), vector.op("@@")(ts_query))
+    matches = matches.subquery()
+
+    page_query = db.query(matches)
+    if cursor is not None:
+        cursor_rank, cursor_id = decode_cursor(cursor)
+        page_query = page_query.filter(or_(
+            matches.c.rank < cursor_rank,
+            and_(matches.c.rank == cursor_rank, matches.c.id < cursor_id)
+        ))
+    page = page_query.order_by(matches.c.rank.desc(), matches.c.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(page[limit - 1].rank, page[limit - 1].id) if len(page) > limit else None
+    page = page[:limit]
+    if not page:
+        return [], None
+
+    # ts_headline is comparatively expensive, so it only runs on the rows of this page
+    headline_source = ParsedResponse.raw_text if field_id is None else ParsedResponse.field_values[str(field_id)].astext
+    headline = func.ts_headline(SEARCH_CONFIG, headline_source, ts_query, HEADLINE_OPTIONS)
+    details_query = db.query(ParsedResponse, User, headline.label("headline")) \
+        .filter(ParsedResponse.id.in_([row.id for row in page]))
+    details = {
+        parsed_response.id: (parsed_response, user, headline)
+        for parsed_response, user, headline in details_query.join(User, User.id == ParsedResponse.user_id)
+    }
+    return [(row.rank, *details[row.id]) for row in page if row.id in details], next_cursor
+
+
+@router.get("/api/experience/search")
+async def api_search_experience(request: Request, q: str, field: str = None, limit: int = 20, cursor: str = None):
+    """
+    Keyword search over experience names, texts and extracted field values.
+    - q: str - search query; supports "quoted phrases", OR and -exclusions
+    - field: Optional[str] - only search the values of the ParseField with this name
+    - limit: Optional[int] - page size (at most MAX_SEARCH_RESULTS)
+    - cursor: Optional[str] - next_cursor from the previous page
+    """
+    log_message(f"api_search_experience called with q: {q}, field: {field}, limit: {limit}")
+    if q.strip() == "":
+        raise HTTPException(status_code=400, detail="Empty search query")
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+    with read_db_context(request) as db:
+        current_user = await get_current_user(request=request, db=db, optional=True)
+        field_id = None
+        if field is not None:
+            field_id = db.query(ParseField.id).filter(ParseField.name == field).scalar()
+            if field_id is None:
+                raise HTTPException(status_code=404, detail="No such field exists")
+
+        rows, next_cursor = search_experiences(db, q, field_id=field_id, limit=limit, cursor=cursor)
+
+        result_dicts = []
+        for rank, parsed_response, user, headline in rows:
+            anonymize = parsed_response.anonymize
+            if current_user is not None and current_user.id == parsed_response.user_id:  # Owners see their own information
+                anonymize = False
+            result_dicts.append({
+                "id": parsed_response.id,
+                "user_id": parsed_response.user_id if not anonymize else None,
+                "name": parsed_response.name,
+                "snippet": render_snippet(headline),
+                "rank": rank,
+                "created_at": parsed_response.created_at.isoformat(),
+                "first_name": user.first_name if not anonymize else None,
+                "last_name": user.last_name if not anonymize else None,
+                "profile_picture_url": user.profile_picture_url if not anonymize else None
+            })
+
+    return {"results": result_dicts, "next_cursor": next_cursor}
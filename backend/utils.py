@@ -1,6 +1,15 @@
-from backend import fields_for_extraction, open_ai_client
+from backend import (
+    log_message, fields_for_extraction,
+    EXTRACTION_FAST_MODEL, EXTRACTION_STRONG_MODEL, EXTRACTION_ESCALATE_NA_FRACTION, EXTRACTION_ESCALATE_MIN_CHARS,
+    EXTRACTION_FORMAT, LLM_DEADLINE_SECONDS, RELEVANCE_PREFILTER
+)
+from backend.llm_resilience import resilient_completion
+from backend.profiling import profile_span
+from backend.relevance import prefilter_fields, with_dropped_fields
 from typing import Optional
 from datetime import datetime, timezone, timedelta
+import json
+import time
 
 def open_ai_llm_call(
     prompt: str,
@@ -8,6 +17,9 @@ def open_ai_llm_call(
     max_retries: int = 0,
     retry_message_override: Optional[str] = None,
     validate_and_process_fn: Optional[callable] = None,
+    call_log: Optional[list] = None,
+    response_format: Optional[dict] = None,
+    deadline: Optional[float] = None,
 ):
     """
     :param prompt: Prompt to send to OpenAI
@@ -15,25 +27,45 @@ def open_ai_llm_call(
     :param max_retries: Maximum number of retries
     :param retry_message_override: If specified, overrides the default retry message
     :param validate_and_process_fn: Function to validate and process the response. Should raise an error for invalid responses
+    :param call_log: If specified, a dict describing each attempt (model, tokens, latency, outcome) is appended to it
+    :param response_format: If specified, passed to OpenAI to request structured (e.g. JSON-schema-constrained) output
+    :param deadline: If specified, time.monotonic() value by which every attempt must have finished
     :return: Output of validate_and_process_fn if it is specified, else the raw response content
     :raises Exception: If the response is not valid
     """
     retry_message = retry_message_override or "There was an error processing your output. Please try again, making sure to follow the instructions."
     conversation = [{"role": "user", "content": prompt}]
     for attempt in range(max_retries + 1):
-        response = open_ai_client.chat.completions.create(
-            model=model,
-            messages=conversation
-        )
+        call_record = {"model": model, "attempt": attempt + 1, "valid": None, "error": None}
+        if call_log is not None:
+            call_log.append(call_record)
+        start_time = time.perf_counter()
+        try:
+            with profile_span("open_ai_llm_call"):
+                response, call_record["model"], call_record["hedged"] = resilient_completion(model, conversation, response_format=response_format, deadline=deadline)
+        except Exception as e:
+            call_record["latency_ms"] = int((time.perf_counter() - start_time) * 1000)
+            call_record["error"] = str(e)
+            raise
+        call_record["latency_ms"] = int((time.perf_counter() - start_time) * 1000)
+        if response.usage is not None:
+            call_record["prompt_tokens"] = response.usage.prompt_tokens
+            call_record["completion_tokens"] = response.usage.completion_tokens
         response_content = response.choices[0].message.content.strip()
-        if validate_and_process_fn is not None:
-            try:
-                return validate_and_process_fn(response_content)
-            except Exception as e:
-                conversation.extend([
-                    {"role": "assistant", "content": response_content},
-                    {"role": "user", "content": retry_message}
-                ])
+        if validate_and_process_fn is None:
+            return response_content
+        try:
+            processed = validate_and_process_fn(response_content)
+        except Exception as e:
+            call_record["valid"] = False
+            call_record["error"] = str(e)
+            conversation.extend([
+                {"role": "assistant", "content": response_content},
+                {"role": "user", "content": retry_message}
+            ])
+            continue
+        call_record["valid"] = True
+        return processed
     raise ValueError(f"Failed after {max_retries} attempts")
 
 extract_fields_prompt = """Consider this list of data fields, which may concern entrepreneurial endeavors ranging from a small local business to an ambitious tech startup:
@@ -51,15 +83,69 @@ Your task is to extract the aforementioned fields from the text. If a field is n
 Do not include any other text in your response (introductions, justifications, bullet points or line numbers, etc.)
 """
 
-def extract_fields(text: str) -> list[tuple[str, Optional[str]]]:
+extract_fields_json_prompt = """Consider this list of data fields, which may concern entrepreneurial endeavors ranging from a small local business to an ambitious tech startup. Each field is preceded by its id:
+{fields}
+
+Also consider this text, which describes a particular entrepreneurial journey:
+{submitted_text}
+
+Your task is to extract the aforementioned fields from the text. You may need to rephrase/reorganize bits from the original text to populate a field. Don't discard any information that addresses the field, and don't infer anything that isn't explicitly stated. Respond with a JSON object that maps each field id to the field's value, or to null if the field is not present in the text.
+"""
+
+def extraction_field_ids(fields: list[str]) -> list[str]:
+    """Short ids used in place of the long field names in structured output; positional within fields."""
+    return [f"f{i + 1}" for i in range(len(fields))]
+
+def extraction_json_schema(field_ids: list[str]) -> dict:
+    """response_format for strict JSON-schema structured output, with one nullable string per field id."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "extracted_fields",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {field_id: {"type": ["string", "null"]} for field_id in field_ids},
+                "required": field_ids,
+                "additionalProperties": False,
+            },
+        },
+    }
+
+def build_extraction_request(text: str, fields: list[str], extraction_format: str) -> tuple[str, callable, Optional[dict]]:
     """
-    Extract fields from text using OpenAI API
+    Build the prompt, response validator and response_format for one extraction
     :param text: text from which to extract fields
-    :return: list of (field, response) tuples, where response is either an LLM-generated paraphrase or None
+    :param fields: fields to extract
+    :param extraction_format: "json" for schema-constrained output keyed by short field ids, "lines" for the labeled line format
+    :return: (prompt, validate_and_process function, response_format or None)
     """
+    if extraction_format == "json":
+        field_ids = extraction_field_ids(fields)
+
+        def validate_and_process(response_content: str) -> list[tuple[str, Optional[str]]]:
+            values = json.loads(response_content)
+            field_response_pairs = []  # list of (field, response) tuples
+            for field_id, field in zip(field_ids, fields):
+                response = values[field_id]
+                if response is not None and not isinstance(response, str):
+                    raise ValueError(f"Value for field {field_id} is not a string")
+                if response is not None:
+                    response = response.strip()
+                    if response == "" or response.lower() == "n/a":
+                        response = None
+                field_response_pairs.append((field, response))
+            return field_response_pairs
+
+        prompt = extract_fields_json_prompt.format(
+            fields="\n".join(f"{field_id}: {field}" for field_id, field in zip(field_ids, fields)),
+            submitted_text=text
+        )
+        return prompt, validate_and_process, extraction_json_schema(field_ids)
+
     def validate_and_process(response_content: str) -> list[tuple[str, Optional[str]]]:
         field_response_pairs = []  # list of (field, response) tuples
-        for i, (field, response_line) in enumerate(zip(fields_for_extraction, response_content.split("\n"))):
+        for i, (field, response_line) in enumerate(zip(fields, response_content.split("\n"))):
             response_field = response_line.split(":")[0].strip()
             if response_field != field:
                 raise ValueError(f"Response field {response_field} does not match expected field {field}")
@@ -69,8 +155,81 @@ def extract_fields(text: str) -> list[tuple[str, Optional[str]]]:
             field_response_pairs.append((field, response))
         return field_response_pairs
 
-    prompt = extract_fields_prompt.format(fields=fields_for_extraction, submitted_text=text)
-    return open_ai_llm_call(prompt, model="gpt-4o", max_retries=1, validate_and_process_fn=validate_and_process)
+    return extract_fields_prompt.format(fields=fields, submitted_text=text), validate_and_process, None
+
+def extract_fields(
+        text: str,
+        fields: Optional[list[str]] = None,
+        call_log: Optional[list] = None,
+        extraction_format: Optional[str] = None,
+        deadline: Optional[float] = None,
+        prefilter: Optional[bool] = None
+) -> list[tuple[str, Optional[str]]]:
+    """
+    Extract fields from text using OpenAI API
+    :param text: text from which to extract fields
+    :param fields: subset of fields to extract (defaults to all of fields_for_extraction)
+    :param call_log: passed through to open_ai_llm_call for LLM call accounting
+    :param extraction_format: "json" or "lines" (defaults to EXTRACTION_FORMAT)
+    :param deadline: time.monotonic() value by which extraction (every tier and retry) must finish; defaults to LLM_DEADLINE_SECONDS from now
+    :param prefilter: whether to skip fields the text is unlikely to address (defaults to RELEVANCE_PREFILTER)
+    :return: list of (field, response) tuples, where response is either an LLM-generated paraphrase or None
+    """
+    all_fields = fields if fields is not None else fields_for_extraction
+    call_log = call_log if call_log is not None else []
+    deadline = deadline if deadline is not None else time.monotonic() + LLM_DEADLINE_SECONDS
+    fields, relevant_text = all_fields, text
+    if prefilter if prefilter is not None else RELEVANCE_PREFILTER:
+        fields, relevant_text = prefilter_fields(text, all_fields, call_log=call_log, deadline=deadline)
+        if not fields:
+            return with_dropped_fields(all_fields, [])
+    prompt, validate_and_process, response_format = build_extraction_request(relevant_text, fields, extraction_format or EXTRACTION_FORMAT)
+
+    fast_pairs = None  # A valid fast-tier result that was escalated only by the quality heuristic
+    if EXTRACTION_FAST_MODEL:
+        fast_calls = []
+        try:
+            field_response_pairs = open_ai_llm_call(prompt, model=EXTRACTION_FAST_MODEL, max_retries=0, validate_and_process_fn=validate_and_process, call_log=fast_calls, response_format=response_format, deadline=deadline)
+            # Judged over every requested field, as without the prefilter: the fields it dropped count as not found
+            escalation_reason = extraction_escalation_reason(text, with_dropped_fields(all_fields, field_response_pairs))
+            fast_pairs = field_response_pairs
+        except Exception:
+            escalation_reason = "invalid_output" if fast_calls and fast_calls[-1]["valid"] is False else "error"
+        for call in fast_calls:
+            call["tier"] = "fast"
+            call["escalation_reason"] = escalation_reason
+        call_log.extend(fast_calls)
+        if escalation_reason is None:
+            return with_dropped_fields(all_fields, field_response_pairs)
+
+    strong_calls = []
+    try:
+        field_response_pairs = open_ai_llm_call(prompt, model=EXTRACTION_STRONG_MODEL, max_retries=1, validate_and_process_fn=validate_and_process, call_log=strong_calls, response_format=response_format, deadline=deadline)
+    except Exception as e:
+        if fast_pairs is None:
+            raise
+        # The fast tier's output was valid, just suspiciously sparse; it beats failing the extraction
+        log_message(f"Strong tier failed after a quality escalation, keeping the fast tier's result: {str(e)}", error=True)
+        field_response_pairs = fast_pairs
+    finally:
+        for call in strong_calls:
+            call["tier"] = "strong"
+        call_log.extend(strong_calls)
+    return with_dropped_fields(all_fields, field_response_pairs)
+
+def extraction_escalation_reason(text: str, field_response_pairs: list[tuple[str, Optional[str]]]) -> Optional[str]:
+    """
+    Quality heuristic applied to a valid fast-tier extraction
+    :param text: text the fields were extracted from
+    :param field_response_pairs: output of the fast tier, for every field that was requested (see with_dropped_fields)
+    :return: reason to escalate to the strong tier, or None if the extraction should be kept
+    """
+    if not field_response_pairs or len(text) < EXTRACTION_ESCALATE_MIN_CHARS:
+        return None
+    na_fraction = sum(1 for _, response in field_response_pairs if response is None) / len(field_response_pairs)
+    if na_fraction >= EXTRACTION_ESCALATE_NA_FRACTION:
+        return "too_many_na"
+    return None
 
 def user_can_perform_limited_action(
         user_actions: dict,
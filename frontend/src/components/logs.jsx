@@ -28,6 +28,7 @@ function Logs({ experienceId = null, userId = null, maxNumber = null }) {
     if (maxNumber !== null) params.append('maxNumber', maxNumber);
     const token = localStorage.getItem('access_token');
     fetch(`${apiUrl}/api/experience${params.toString() ? '?' + params.toString() : ''}`, {
+      credentials: 'include',
       headers: token ? { 'authorization': `Bearer ${token}` } : {}
     })
       .then(res => {
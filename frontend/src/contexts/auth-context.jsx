@@ -175,6 +175,7 @@ export const AuthProvider = ({ children }) => {
     try {
       const response = await fetch(`${apiUrl}/api/auth/linkedin/callback`, {
         method: 'POST',
+        credentials: 'include',
         headers: {
           'Content-Type': 'application/json',
         },
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { useAuth } from '@/contexts/auth-context';
 import { Button } from '@/components/ui/button';
 import { Textarea } from '@/components/ui/textarea';
@@ -19,6 +19,9 @@ function ContributeExperience() {
   const [success, setSuccess] = useState(false);
   const [fieldsExtracted, setFieldsExtracted] = useState(null);
   const [showFieldsDialog, setShowFieldsDialog] = useState(false);
+  // Sent with submissions so that retrying one that got no answer can't submit it twice. The key belongs to one
+  // request body ({ key, body }): submitting an edited text is a new request and gets a new key
+  const idempotencyKey = useRef(null);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -27,16 +30,25 @@ function ContributeExperience() {
     setSuccess(false);
     setFieldsExtracted(null);
     setShowFieldsDialog(false);
+    const body = JSON.stringify({ experienceName, experience, anonymize });
+    if (!idempotencyKey.current || idempotencyKey.current.body !== body) {
+      idempotencyKey.current = { key: crypto.randomUUID(), body };
+    }
     try {
       const response = await fetch(`${apiUrl}/api/experience/submit`, {
         method: 'POST',
         credentials: 'include',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencyKey.current.key,
           ...(token ? { 'Authorization': `Bearer ${token}` } : {}),
         },
-        body: JSON.stringify({ experienceName, experience, anonymize }),
+        body,
       });
+      if (response.status !== 409) {
+        // Answered (409 means the first attempt is still running), so the next submission is a new request
+        idempotencyKey.current = null;
+      }
       if (!response.ok) {
         throw new Error('Failed to submit experience');
       }
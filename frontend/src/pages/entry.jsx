@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { useParams, useLocation } from "react-router-dom";
 import { useAuth } from "@/contexts/auth-context";
 import { Pencil, Trash } from 'lucide-react';
@@ -21,6 +21,9 @@ const Entry = () => {
   const [formData, setFormData] = useState({});
   const [anonymize, setAnonymize] = useState(false);
   const apiUrl = import.meta.env.VITE_BACKEND_API_URL;
+  // Sent with submissions so that retrying one that got no answer can't submit it twice. The key belongs to one
+  // request body ({ key, body }): submitting an edited text is a new request and gets a new key
+  const idempotencyKey = useRef(null);
 
   // Check if we should start in edit mode (from logs.jsx)
   useEffect(() => {
@@ -36,6 +39,7 @@ const Entry = () => {
       setLoading(true);
       try {
         const res = await fetch(`${apiUrl}/api/experience?experienceId=${experienceId}`, {
+          credentials: 'include',
           headers: token ? { 'authorization': `Bearer ${token}` } : {}
         });
         if (!res.ok) throw new Error("Failed to fetch experience");
@@ -82,21 +86,30 @@ const Entry = () => {
     setErrorEdit(null);
     setFieldsExtracted(null);
     setShowFieldsDialog(false);
+    const body = JSON.stringify({
+      existingExperienceId: experienceId,
+      experienceName: formData.name,
+      experience: formData.raw_text,
+      anonymize: anonymize,
+    });
+    if (!idempotencyKey.current || idempotencyKey.current.body !== body) {
+      idempotencyKey.current = { key: crypto.randomUUID(), body };
+    }
     try {
       const response = await fetch(`${apiUrl}/api/experience/submit`, {
         method: 'POST',
         credentials: 'include',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencyKey.current.key,
           ...(token ? { 'authorization': `Bearer ${token}` } : {}),
         },
-        body: JSON.stringify({
-          existingExperienceId: experienceId,
-          experienceName: formData.name,
-          experience: formData.raw_text,
-          anonymize: anonymize,
-        }),
+        body,
       });
+      if (response.status !== 409) {
+        // Answered (409 means the first attempt is still running), so the next submission is a new request
+        idempotencyKey.current = null;
+      }
       if (!response.ok) {
         throw new Error('Failed to update experience');
       }